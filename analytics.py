@@ -0,0 +1,556 @@
+"""Dashboard analytics over the deposit, withdraw and member frames.
+
+``calculate_comprehensive_analytics`` works directly on (filtered) raw
+frames. ``DailyCube`` pre-aggregates the additive measures once at
+(Date, Line) granularity so the dashboard's date range + Line filter can be
+answered from cumulative sums in O(days x lines) instead of rescanning rows.
+Distinct member counts come from per-cell member sets (see ``distinct``).
+The row-level groupbys of ``calculate_comprehensive_analytics`` and
+``generate_time_series_analytics`` run on the execution backend (see
+``backends``); the cube paths do not use it.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from backends import get_backend
+from distinct import DISTINCT_MODE, DistinctMembers, encode_members
+from metrics import WINRATE_BETS, WINRATE_WEIGHTED, evaluate, winrate_components
+
+# Additive measures kept per table in the cube
+CUBE_MEASURES = {
+    'deposit': ['Deposit_Amount', 'Deposit_Cases'],
+    'withdraw': ['Withdraw_Amount', 'Withdraw_Cases'],
+    'member': [
+        'GGR', 'Net_Profit', 'Deposit_Amount', 'Withdraw_Amount', 'Cases_Bets',
+        'Bets_Amount', 'Valid_Amount', 'Add_Bonus', 'Deduct_Bonus',
+    ],
+}
+
+# Measures every cube table carries besides CUBE_MEASURES
+RECORDS = 'Records'
+# Member table measures computed from two columns (see metrics.winrate_components)
+WINRATE_MEASURES = [WINRATE_WEIGHTED, WINRATE_BETS]
+
+INTEGER_MEASURES = {'Deposit_Cases', 'Withdraw_Cases', 'Cases_Bets', RECORDS}
+
+# Member amounts broken down by original currency, in MYR and in the original currency
+CURRENCY_MEASURES = ['Deposit_Amount', 'Withdraw_Amount', 'GGR']
+ORIGINAL_SUFFIX = '_Original'
+
+
+def slice_by_date(df, start_date, end_date):
+    """Rows of ``df`` with start_date <= Date <= end_date.
+
+    Frames coming out of the ingest layer are sorted by Date, so this is a
+    binary search and a positional slice rather than a per-row comparison.
+    """
+    if df.empty:
+        return df
+    lo, hi = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + np.timedelta64(1, 'D')
+    dates = df['Date'].to_numpy()
+    if not df['Date'].is_monotonic_increasing:
+        return df[(dates >= lo) & (dates < hi)]
+    return df.iloc[np.searchsorted(dates, lo, 'left'):np.searchsorted(dates, hi, 'left')]
+
+
+def _derive_metrics(analytics):
+    """Fill in the KPIs (see ``metrics.KPIS``) from the summed totals"""
+    analytics.update(evaluate(analytics))
+    return analytics
+
+
+# Calculate comprehensive analytics
+def calculate_comprehensive_analytics(deposit_df, withdraw_df, member_df, backend=None):
+    """Calculate comprehensive financial analytics"""
+
+    analytics = {}
+
+    # Basic Financial Metrics
+    analytics['total_deposit'] = deposit_df['Deposit_Amount'].sum() if not deposit_df.empty else 0
+    analytics['total_withdraw'] = withdraw_df['Withdraw_Amount'].sum() if not withdraw_df.empty else 0
+    analytics['total_deposit_cases'] = deposit_df['Deposit_Cases'].sum() if not deposit_df.empty else 0
+    analytics['total_withdraw_cases'] = withdraw_df['Withdraw_Cases'].sum() if not withdraw_df.empty else 0
+
+    # GGR and Net Profit
+    analytics['total_ggr'] = member_df['GGR'].sum() if not member_df.empty else 0
+    analytics['total_net_profit'] = member_df['Net_Profit'].sum() if not member_df.empty else 0
+
+    # Betting Analytics
+    analytics['total_bets'] = member_df['Cases_Bets'].sum() if not member_df.empty else 0
+    analytics['total_bets_amount'] = member_df['Bets_Amount'].sum() if not member_df.empty else 0
+    analytics['total_valid_amount'] = member_df['Valid_Amount'].sum() if not member_df.empty else 0
+
+    # Bonus Analytics
+    analytics['total_bonus_given'] = member_df['Add_Bonus'].sum() if not member_df.empty else 0
+    analytics['total_bonus_deducted'] = member_df['Deduct_Bonus'].sum() if not member_df.empty else 0
+
+    # Active Members
+    analytics['total_active_members'] = member_df['User_Name'].nunique() if not member_df.empty else 0
+
+    # Win Rate components (weighted by Cases_Bets)
+    weighted, bets = winrate_components(member_df) if not member_df.empty else (np.zeros(0), np.zeros(0))
+    analytics['total_winrate_weighted'] = weighted.sum()
+    analytics['total_winrate_bets'] = bets.sum()
+
+    # Line Performance
+    if not member_df.empty:
+        analytics['line_performance'] = get_backend(backend).line_performance(member_df)
+    else:
+        analytics['line_performance'] = pd.DataFrame()
+
+    return _derive_metrics(analytics)
+
+
+def metrics_table(analytics):
+    """Summary table of the financial totals (Operational Reports)"""
+    metrics_data = {
+        'Metric': [
+            'Total Revenue (Deposit)', 
+            'Total Payout (Withdraw)', 
+            'Gross Gaming Revenue (GGR)', 
+            'Net Profit',
+            'Total Bets Placed',
+            'Total Valid Amount',
+            'Bonus Given',
+            'Bonus Deducted',
+            'Net Bonus'
+        ],
+        'Value (RM)': [
+            f"{analytics['total_deposit']:,.2f}",
+            f"{analytics['total_withdraw']:,.2f}",
+            f"{analytics['total_ggr']:,.2f}",
+            f"{analytics['total_net_profit']:,.2f}",
+            f"{analytics['total_bets_amount']:,.2f}",
+            f"{analytics['total_valid_amount']:,.2f}",
+            f"{analytics['total_bonus_given']:,.2f}",
+            f"{analytics['total_bonus_deducted']:,.2f}",
+            f"{analytics['net_bonus']:,.2f}"
+        ],
+        'Cases/Count': [
+            f"{analytics['total_deposit_cases']:,}",
+            f"{analytics['total_withdraw_cases']:,}",
+            "-",
+            "-",
+            f"{analytics['total_bets']:,}",
+            "-",
+            "-",
+            "-",
+            "-"
+        ]
+    }
+    return pd.DataFrame(metrics_data)
+
+
+def kpi_table(analytics):
+    """Key performance indicator table (Operational Reports)"""
+    kpi_data = {
+        'KPI': [
+            'Deposit to Withdraw Ratio',
+            'GGR Margin (%)',
+            'Valid Bet Ratio (%)',
+            'Average Deposit per Case',
+            'Average Withdraw per Case',
+            'Average GGR per Member',
+            'Overall Win Rate (%)',
+            'Active Members'
+        ],
+        'Value': [
+            f"{analytics['deposit_to_withdraw_ratio']:.2f}",
+            f"{analytics['ggr_margin']:.2f}%",
+            f"{analytics['valid_bet_ratio']:.2f}%",
+            f"RM {analytics['avg_deposit_per_case']:,.2f}",
+            f"RM {analytics['avg_withdraw_per_case']:,.2f}",
+            f"RM {analytics['avg_ggr_per_member']:,.2f}",
+            f"{analytics['overall_winrate']:.2%}",
+            f"{analytics['total_active_members']:,}"
+        ]
+    }
+    return pd.DataFrame(kpi_data)
+
+
+class DailyCube:
+    """Additive measures of all three tables pre-aggregated per (Date, Line).
+
+    For each table the cube keeps a ``(days + 1, lines, measures)`` array of
+    cumulative sums over the sorted date index, so the total of any date
+    range is one subtraction after two binary searches.
+    """
+
+    def __init__(self, deposit_df, withdraw_df, member_df, distinct_mode=DISTINCT_MODE):
+        frames = {'deposit': deposit_df, 'withdraw': withdraw_df, 'member': member_df}
+        frames = {table: df for table, df in frames.items() if not df.empty}
+
+        self.dates = np.unique(np.concatenate([
+            df['Date'].to_numpy().astype('datetime64[D]') for df in frames.values()
+        ])) if frames else np.array([], dtype='datetime64[D]')
+        self.lines = sorted(set().union(*(df['Line'].unique() for df in frames.values())))
+
+        self.measures = {}
+        self.cumulative = {}
+        for table, measures in CUBE_MEASURES.items():
+            df = frames.get(table)
+            names = [col for col in measures if df is not None and col in df.columns] + [RECORDS]
+            if df is not None and table == 'member' and {'Winrate', 'Cases_Bets'} <= set(df.columns):
+                names += WINRATE_MEASURES
+            grid = self._aggregate(df, names) if df is not None else np.zeros((len(self.dates), len(self.lines), len(names)))
+            self.measures[table] = {name: i for i, name in enumerate(names)}
+            self.cumulative[table] = np.concatenate([np.zeros((1,) + grid.shape[1:]), grid.cumsum(axis=0)])
+
+        # User_Name is dictionary-encoded; the raw string column is not needed after this
+        self.members = None
+        member_df = frames.get('member')
+        if member_df is not None and 'User_Name' in member_df.columns:
+            member_ids, self.member_names = encode_members(member_df['User_Name'])
+            day_idx, line_idx = self._cell_index(member_df)
+            self.members = DistinctMembers(
+                member_ids, day_idx, line_idx, len(self.dates), len(self.lines),
+                len(self.member_names), distinct_mode,
+            )
+
+        # Per original currency totals of the member table: (days + 1, lines, currencies, measures)
+        self.currencies = []
+        self.currency_measures = [RECORDS]
+        if member_df is not None and 'Original_Currency' in member_df.columns:
+            currency = member_df['Original_Currency'].astype('category')
+            self.currencies = list(currency.cat.categories)
+            columns = [col for col in CURRENCY_MEASURES if col in member_df.columns]
+            self.currency_measures = [RECORDS] + columns + [col + ORIGINAL_SUFFIX for col in columns]
+            grid = self._aggregate(
+                member_df, self.currency_measures, split=(currency.cat.codes.to_numpy(), len(self.currencies))
+            )
+            self.currency_cumulative = np.concatenate([np.zeros((1,) + grid.shape[1:]), grid.cumsum(axis=0)])
+
+    def _cell_index(self, df):
+        day_idx = np.searchsorted(self.dates, df['Date'].to_numpy().astype('datetime64[D]'))
+        line_idx = pd.Categorical(df['Line'], categories=self.lines).codes
+        return day_idx, line_idx
+
+    def _aggregate(self, df, names, split=None):
+        """Sum ``names`` per cell; ``split`` = (codes, n) adds one more grouping axis"""
+        n_dates, n_lines = len(self.dates), len(self.lines)
+        n_groups = split[1] if split else 1
+        day_idx, line_idx = self._cell_index(df)
+        cell = (day_idx * n_lines + line_idx) * n_groups
+        # Rows without a Line cannot be placed in the cube
+        valid = line_idx >= 0
+        if split:
+            cell = cell + split[0]
+            valid &= split[0] >= 0
+        cell = cell[valid]
+
+        n_cells = n_dates * n_lines * n_groups
+        grid = np.empty((n_cells, len(names)))
+        for j, name in enumerate(names):
+            if name == RECORDS:
+                weights = None
+            elif name in WINRATE_MEASURES:
+                weights = winrate_components(df)[WINRATE_MEASURES.index(name)][valid]
+            elif name.endswith(ORIGINAL_SUFFIX):
+                column = name[:-len(ORIGINAL_SUFFIX)]
+                weights = np.nan_to_num((df[column] / df['FX_Rate']).to_numpy(dtype='float64'))[valid]
+            else:
+                weights = np.nan_to_num(df[name].to_numpy(dtype='float64'))[valid]
+            grid[:, j] = np.bincount(cell, weights=weights, minlength=n_cells)
+        shape = (n_dates, n_lines, n_groups, len(names)) if split else (n_dates, n_lines, len(names))
+        return grid.reshape(shape)
+
+    def _day_bounds(self, start_date, end_date):
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, 'D'), 'left')
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, 'D'), 'right')
+        return lo, max(hi, lo)
+
+    def _window(self, table, start_date, end_date):
+        """Per-line sums of ``table`` over the date range, shape (lines, measures)"""
+        lo, hi = self._day_bounds(start_date, end_date)
+        cumulative = self.cumulative[table]
+        return cumulative[hi] - cumulative[lo]
+
+    def _line_mask(self, lines):
+        if lines is None:
+            return np.ones(len(self.lines), dtype=bool)
+        return np.isin(self.lines, list(lines))
+
+    def _as_values(self, table, sums):
+        values = {}
+        for name, j in self.measures[table].items():
+            values[name] = int(round(sums[j])) if name in INTEGER_MEASURES else float(sums[j])
+        return values
+
+    def totals(self, table, start_date, end_date, lines=None):
+        """Measure totals of ``table`` over a date range and a set of lines (None = all)"""
+        window = self._window(table, start_date, end_date)
+        return self._as_values(table, window[self._line_mask(lines)].sum(axis=0))
+
+    def period_totals(self, table, periods, lines=None):
+        """Measure totals of ``table`` for each (start_date, end_date) in ``periods``"""
+        if not periods:
+            return []
+        starts = np.array([np.datetime64(start, 'D') for start, _ in periods])
+        ends = np.array([np.datetime64(end, 'D') for _, end in periods])
+        lo = np.searchsorted(self.dates, starts, 'left')
+        hi = np.maximum(np.searchsorted(self.dates, ends, 'right'), lo)
+        cumulative = self.cumulative[table]
+        # (periods, lines, measures) in one gather, then summed over the selected lines
+        sums = (cumulative[hi] - cumulative[lo])[:, self._line_mask(lines)].sum(axis=1)
+        return [self._as_values(table, period) for period in sums]
+
+    def by_line(self, table, start_date, end_date, lines=None):
+        """Measure totals per Line for lines that have rows in the range"""
+        window = self._window(table, start_date, end_date)
+        names = list(self.measures[table])
+        by_line = pd.DataFrame(window, columns=names)
+        by_line.insert(0, 'Line', self.lines)
+        by_line = by_line[self._line_mask(lines) & (window[:, self.measures[table][RECORDS]] > 0)]
+        for name in INTEGER_MEASURES.intersection(names):
+            by_line[name] = by_line[name].round().astype('int64')
+        return by_line.reset_index(drop=True)
+
+    def daily(self, table, start_date, end_date, lines=None):
+        """Per-day measure sums of ``table`` over the date range, shape (days, measures)"""
+        lo, hi = self._day_bounds(start_date, end_date)
+        return np.diff(self.cumulative[table][lo:hi + 1], axis=0)[:, self._line_mask(lines)].sum(axis=1)
+
+    def currency_breakdown(self, start_date, end_date, lines=None):
+        """Member records and amounts per original currency over the date range.
+
+        Empty (with the Currency and Records columns) when the exports carry
+        no Currency column or the range has no member rows.
+        """
+        if self.currencies:
+            lo, hi = self._day_bounds(start_date, end_date)
+            window = self.currency_cumulative[hi] - self.currency_cumulative[lo]
+            sums = window[self._line_mask(lines)].sum(axis=0)
+        else:
+            sums = np.zeros((0, len(self.currency_measures)))
+        breakdown = pd.DataFrame(sums, columns=self.currency_measures)
+        breakdown.insert(0, 'Currency', np.array(self.currencies, dtype=object))
+        breakdown[RECORDS] = breakdown[RECORDS].round().astype('int64')
+        return breakdown[breakdown[RECORDS] > 0].reset_index(drop=True)
+
+    def active_members(self, start_date, end_date, lines=None):
+        """Distinct members active in the date range on any of ``lines`` (None = all)"""
+        if self.members is None:
+            return 0
+        lo, hi = self._day_bounds(start_date, end_date)
+        line_idx = np.flatnonzero(self._line_mask(lines))
+        return self.members.count(self.members.cells(lo, hi, line_idx))
+
+    def active_members_by_line(self, start_date, end_date, lines=None):
+        """Distinct members per Line over the date range"""
+        if self.members is None:
+            return {}
+        lo, hi = self._day_bounds(start_date, end_date)
+        return {
+            self.lines[i]: self.members.count(self.members.cells(lo, hi, [i]))
+            for i in np.flatnonzero(self._line_mask(lines))
+        }
+
+
+def _cube_metrics(deposit, withdraw, member, active_members):
+    """Headline metrics from the cube totals of one date range"""
+    return {
+        'total_deposit': deposit.get('Deposit_Amount', 0),
+        'total_withdraw': withdraw.get('Withdraw_Amount', 0),
+        'total_deposit_cases': deposit.get('Deposit_Cases', 0),
+        'total_withdraw_cases': withdraw.get('Withdraw_Cases', 0),
+        'total_ggr': member.get('GGR', 0),
+        'total_net_profit': member.get('Net_Profit', 0),
+        'total_bets': member.get('Cases_Bets', 0),
+        'total_bets_amount': member.get('Bets_Amount', 0),
+        'total_valid_amount': member.get('Valid_Amount', 0),
+        'total_bonus_given': member.get('Add_Bonus', 0),
+        'total_bonus_deducted': member.get('Deduct_Bonus', 0),
+        'total_active_members': active_members,
+        'total_winrate_weighted': member.get(WINRATE_WEIGHTED, 0.0),
+        'total_winrate_bets': member.get(WINRATE_BETS, 0.0),
+    }
+
+
+def calculate_cube_analytics(cube, start_date, end_date, lines=None):
+    """Same metrics as calculate_comprehensive_analytics, answered from the cube"""
+    analytics = _cube_metrics(
+        cube.totals('deposit', start_date, end_date, lines),
+        cube.totals('withdraw', start_date, end_date, lines),
+        cube.totals('member', start_date, end_date, lines),
+        cube.active_members(start_date, end_date, lines),
+    )
+
+    line_performance = cube.by_line('member', start_date, end_date, lines)
+    if not line_performance.empty:
+        members_per_line = cube.active_members_by_line(start_date, end_date, line_performance['Line'])
+        line_performance = line_performance[['Line', 'GGR', 'Net_Profit', 'Deposit_Amount', 'Withdraw_Amount']]
+        line_performance['User_Name'] = line_performance['Line'].map(members_per_line).astype('int64')
+        analytics['line_performance'] = line_performance
+    else:
+        analytics['line_performance'] = pd.DataFrame()
+
+    return _derive_metrics(analytics)
+
+
+def calculate_cube_comparison(cube, periods, lines=None):
+    """Headline metrics of several (start_date, end_date) ranges, without line performance.
+
+    The totals of all ranges come from one gather of the cumulative sums
+    per table and the KPIs of all ranges from one ``evaluate``, so
+    comparing periods costs about as much as one range.
+    """
+    totals = {table: cube.period_totals(table, periods, lines) for table in CUBE_MEASURES}
+    results = [
+        _cube_metrics(
+            totals['deposit'][i], totals['withdraw'][i], totals['member'][i],
+            cube.active_members(start_date, end_date, lines),
+        )
+        for i, (start_date, end_date) in enumerate(periods)
+    ]
+    if not results:
+        return []
+    kpis = evaluate({key: np.array([result[key] for result in results]) for key in results[0]})
+    for i, result in enumerate(results):
+        result.update({name: float(values[i]) for name, values in kpis.items()})
+    return results
+
+
+# Periods the dashboard compares the selected date range with
+COMPARISON_MODES = {
+    'previous': 'previous period',
+    'week': 'previous week',
+    'month': 'same period last month',
+}
+
+
+def comparison_range(start_date, end_date, mode):
+    """The (start_date, end_date) range to compare a range with, for a COMPARISON_MODES key"""
+    if mode == 'previous':
+        days = (end_date - start_date).days + 1
+        return start_date - timedelta(days=days), start_date - timedelta(days=1)
+    if mode == 'week':
+        return start_date - timedelta(days=7), end_date - timedelta(days=7)
+    if mode == 'month':
+        month = pd.DateOffset(months=1)
+        return (pd.Timestamp(start_date) - month).date(), (pd.Timestamp(end_date) - month).date()
+    raise ValueError(f"Unknown comparison mode: {mode} (use {', '.join(COMPARISON_MODES)})")
+
+
+def comparison_modes(start_date, end_date):
+    """The COMPARISON_MODES whose range ends before ``start_date``.
+
+    Shifting a range longer than a week back by 7 days (or one longer than
+    a month back by a month) overlaps the range itself, so those modes are
+    left out; 'previous' always applies.
+    """
+    return {
+        mode: label for mode, label in COMPARISON_MODES.items()
+        if comparison_range(start_date, end_date, mode)[1] < start_date
+    }
+
+
+# Measures summed per period by the time series: (table, measure, column)
+TIME_SERIES_MEASURES = [
+    ('member', 'GGR', 'GGR'),
+    ('member', 'Net_Profit', 'Net_Profit'),
+    ('member', 'Deposit_Amount', 'Deposit_Amount'),
+    ('member', 'Withdraw_Amount', 'Withdraw_Amount'),
+    ('member', 'Cases_Bets', 'Cases_Bets'),
+    ('member', 'Bets_Amount', 'Bets_Amount'),
+    ('member', 'Valid_Amount', 'Valid_Amount'),
+    ('deposit', 'Deposit_Amount', 'Total_Deposit'),
+    ('deposit', 'Deposit_Cases', 'Deposit_Cases'),
+    ('withdraw', 'Withdraw_Amount', 'Total_Withdraw'),
+    ('withdraw', 'Withdraw_Cases', 'Withdraw_Cases'),
+]
+
+
+def _build_time_series(daily, count_members):
+    """Roll daily sums up into daily, weekly and monthly stats.
+
+    ``daily`` holds one row per day that has data, indexed by the sorted
+    day. Weeks and months are runs of consecutive rows, so every period is
+    one ``reduceat`` slice. ``count_members(lo, hi)`` returns the distinct
+    members over the days at positions lo..hi-1.
+    """
+    days = pd.DatetimeIndex(daily.index)
+    iso = days.isocalendar()
+    # ISO week key carries the ISO year, so week 1 of two years never merges
+    weeks = (iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)).to_numpy()
+    periods = {
+        'daily_stats': ('Date', days.to_numpy()),
+        'weekly_stats': ('Week', weeks),
+        'monthly_stats': ('Month', days.strftime('%Y-%m').to_numpy()),
+    }
+
+    values = daily.to_numpy(dtype='float64')
+    time_series = {}
+    for name, (period, keys) in periods.items():
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.array([], dtype=np.int64)
+        ends = np.append(starts[1:], len(keys))
+        sums = np.add.reduceat(values, starts, axis=0) if len(starts) else values
+        stats = pd.DataFrame(sums, columns=daily.columns)
+        stats.insert(0, period, keys[starts])
+        if period == 'Week':
+            stats.insert(1, 'Week_Start', days[starts] - pd.to_timedelta(days[starts].weekday, unit='D'))
+        for col in INTEGER_MEASURES.intersection(stats.columns):
+            stats[col] = stats[col].round().astype('int64')
+        stats['User_Name'] = np.array([count_members(lo, hi) for lo, hi in zip(starts, ends)], dtype='int64')
+        time_series[name] = stats
+    return time_series
+
+
+# Generate time series data
+def generate_time_series_analytics(deposit_df, withdraw_df, member_df, backend=None):
+    """Generate time series analytics for charts"""
+
+    frames = {'deposit': deposit_df, 'withdraw': withdraw_df, 'member': member_df}
+    if member_df.empty:
+        return {}
+
+    # One groupby pass per table over its day, then everything rolls up from the daily sums
+    backend = get_backend(backend)
+    daily = []
+    for table, df in frames.items():
+        columns = {measure: column for t, measure, column in TIME_SERIES_MEASURES if t == table and measure in df.columns}
+        if columns and not df.empty:
+            daily.append(backend.daily_sums(df, columns))
+    daily = pd.concat(daily, axis=1).sort_index().fillna(0)
+
+    # Distinct (day, member) pairs, sorted by day
+    member_days, member_ids = backend.member_days(member_df)
+    day_pos = np.searchsorted(daily.index.to_numpy(), member_days)
+    n_members = int(member_ids.max()) + 1 if len(member_ids) else 1
+    pairs = np.unique(day_pos.astype(np.int64) * n_members + member_ids)
+    pair_days, pair_members = pairs // n_members, pairs % n_members
+
+    def count_members(lo, hi):
+        a, b = np.searchsorted(pair_days, [lo, hi])
+        return np.unique(pair_members[a:b]).size
+
+    return _build_time_series(daily, count_members)
+
+
+def calculate_cube_time_series(cube, start_date, end_date, lines=None):
+    """Same series as generate_time_series_analytics, answered from the cube"""
+    if cube.members is None:
+        return {}
+    lo, hi = cube._day_bounds(start_date, end_date)
+    line_mask = cube._line_mask(lines)
+
+    columns, has_rows = {}, np.zeros(hi - lo, dtype=bool)
+    for table in ('deposit', 'withdraw', 'member'):
+        daily = cube.daily(table, start_date, end_date, lines)
+        has_rows |= daily[:, cube.measures[table][RECORDS]] > 0
+        for t, measure, column in TIME_SERIES_MEASURES:
+            if t == table and measure in cube.measures[table]:
+                columns[column] = daily[:, cube.measures[table][measure]]
+
+    # Days without rows for the selected lines are left out, as in the row-based version
+    days = np.flatnonzero(has_rows)
+    daily = pd.DataFrame({column: values[days] for column, values in columns.items()},
+                         index=pd.DatetimeIndex(cube.dates[lo:hi][days].astype('datetime64[ns]'), name='Date'))
+    line_idx = np.flatnonzero(line_mask)
+
+    def count_members(a, b):
+        # Periods are contiguous in the full date index too; skipped days have no members
+        return cube.members.count(cube.members.cells(lo + days[a], lo + days[b - 1] + 1, line_idx))
+
+    return _build_time_series(daily, count_members)
@@ -0,0 +1,215 @@
+"""Rolling anomaly detection on the daily metrics of every Line.
+
+For each (day, Line) the detector takes five metrics from the cube:
+
+    Deposit_Amount    deposit report
+    Withdraw_Amount   withdraw report
+    GGR               member report
+    WD_Ratio          Withdraw_Amount / Deposit_Amount
+    Winrate           win rate weighted by Cases_Bets
+
+and compares each value with a robust baseline of the same Line: the
+median and the MAD (median absolute deviation) of the previous
+``ANOMALY_WINDOW`` calendar days (days a Line has no rows for, or the cube
+has no data for at all, are left out). The score is the robust z-score ``(value - median) / (1.4826 * MAD)``;
+a day is flagged when ``|z|`` reaches the threshold. A baseline needs at
+least ``ANOMALY_MIN_PERIODS`` values; where the MAD is 0 (a flat history)
+the mean absolute deviation stands in for it.
+
+All Lines and metrics are one ``(days, lines, metrics)`` array and the
+windows are strided views of it, so there is no per-Line loop. Updates are
+incremental: a new data version only recomputes the days from the first
+one whose values changed, which after a normal ingest is just the new days.
+"""
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from analytics import RECORDS
+from metrics import WINRATE_BETS, WINRATE_WEIGHTED, evaluate
+from queries import normalize_lines
+
+ANOMALY_METRICS = ['Deposit_Amount', 'Withdraw_Amount', 'GGR', 'WD_Ratio', 'Winrate']
+
+# Days of history in a baseline and the fewest it may be built from
+ANOMALY_WINDOW = 28
+ANOMALY_MIN_PERIODS = 7
+# |robust z| from which a day is flagged
+ANOMALY_THRESHOLD = 3.5
+
+# MAD and mean absolute deviation scaled to a standard deviation of normal data
+_MAD_SCALE = 1.4826
+_MEAN_AD_SCALE = 1.2533
+
+
+def _measure(cube, daily, table, name):
+    """Per (day, Line) sums of a cube measure, NaN where ``table`` has no rows"""
+    measures = cube.measures[table]
+    present = daily[table][:, :, measures[RECORDS]] > 0
+    if name not in measures:
+        return np.full(present.shape, np.nan)
+    return np.where(present, daily[table][:, :, measures[name]], np.nan)
+
+
+def daily_metrics(cube):
+    """The ANOMALY_METRICS of every day and Line of the cube, shape (days, lines, metrics)"""
+    daily = {table: np.diff(cumulative, axis=0) for table, cumulative in cube.cumulative.items()}
+    deposit = _measure(cube, daily, 'deposit', 'Deposit_Amount')
+    withdraw = _measure(cube, daily, 'withdraw', 'Withdraw_Amount')
+    ggr = _measure(cube, daily, 'member', 'GGR')
+    # Ratios as declared in metrics.KPIS, NaN where the denominator is 0
+    kpis = evaluate({
+        'total_deposit': deposit,
+        'total_withdraw': withdraw,
+        'total_winrate_weighted': _measure(cube, daily, 'member', WINRATE_WEIGHTED),
+        'total_winrate_bets': _measure(cube, daily, 'member', WINRATE_BETS),
+    }, ['withdraw_to_deposit_ratio', 'overall_winrate'], empty=np.nan)
+    return np.stack([deposit, withdraw, ggr, kpis['withdraw_to_deposit_ratio'], kpis['overall_winrate']], axis=-1)
+
+
+def rolling_baseline(values, start=0, window=ANOMALY_WINDOW, min_periods=ANOMALY_MIN_PERIODS, dates=None):
+    """Median and robust scale of the ``window`` days before each day from ``start`` on.
+
+    ``values`` is (days, ...) for the sorted ``dates`` (default: consecutive
+    days); the result covers days start..end, NaN where fewer than
+    ``min_periods`` of the previous days have a value.
+    """
+    if dates is None:
+        days = np.arange(len(values))
+    else:
+        days = (dates - dates[0]).astype('timedelta64[D]').astype(np.int64) if len(dates) else np.empty(0, dtype=np.int64)
+    # On a daily calendar, so a window is ``window`` calendar days even where dates are missing
+    calendar = np.full((days[-1] + 1 if len(days) else 0,) + values.shape[1:], np.nan)
+    calendar[days] = values
+    padded = np.concatenate([np.full((window,) + values.shape[1:], np.nan), calendar[:-1]])
+    # windows[t] holds calendar days t - window .. t - 1, on the last axis
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)[days[start:]]
+    enough = (~np.isnan(windows)).sum(axis=-1) >= min_periods
+    with warnings.catch_warnings():
+        # All-NaN windows (a Line's first days) are masked out below
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=-1)
+        deviation = np.abs(windows - median[..., None])
+        scale = _MAD_SCALE * np.nanmedian(deviation, axis=-1)
+        flat = scale == 0
+        if flat.any():
+            scale[flat] = _MEAN_AD_SCALE * np.nanmean(deviation, axis=-1)[flat]
+    median[~enough] = np.nan
+    scale[~enough | (scale == 0)] = np.nan
+    return median, scale
+
+
+class AnomalyDetector:
+    """Rolling baselines and robust z-scores of all Lines, kept up to date with the cube"""
+
+    def __init__(self, window=ANOMALY_WINDOW, min_periods=ANOMALY_MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self.version = None
+        self.lock = threading.Lock()
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.lines = []
+        self.values = np.empty((0, 0, len(ANOMALY_METRICS)))
+        self.baseline = self.values.copy()
+        self.scale = self.values.copy()
+        self.z = self.values.copy()
+
+    def _first_changed(self, dates, lines, values):
+        """First day whose values differ from the processed ones (0 = all)"""
+        if list(lines) != list(self.lines):
+            return 0
+        n = min(len(self.dates), len(dates))
+        same_date = dates[:n] == self.dates[:n]
+        same_values = np.isclose(values[:n], self.values[:n], rtol=1e-9, atol=1e-6, equal_nan=True).all(axis=(1, 2))
+        changed = np.flatnonzero(~(same_date & same_values))
+        return int(changed[0]) if len(changed) else n
+
+    def update(self, cube):
+        """Recompute baselines and scores from the first day that changed in ``cube``"""
+        values = daily_metrics(cube)
+        start = self._first_changed(cube.dates, cube.lines, values)
+        median, scale = rolling_baseline(values, start, self.window, self.min_periods, cube.dates)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (values[start:] - median) / scale
+        # Days before ``start`` keep their baselines and scores
+        self.baseline = np.concatenate([self.baseline[:start], median]) if start else median
+        self.scale = np.concatenate([self.scale[:start], scale]) if start else scale
+        self.z = np.concatenate([self.z[:start], z]) if start else z
+        self.dates, self.lines, self.values = cube.dates.copy(), list(cube.lines), values
+        return self
+
+    def _select(self, start_date, end_date, lines):
+        days = np.flatnonzero((self.dates >= np.datetime64(start_date, 'D')) & (self.dates <= np.datetime64(end_date, 'D')))
+        lines = normalize_lines(lines)
+        line_idx = np.flatnonzero(np.isin(self.lines, list(lines))) if lines is not None else np.arange(len(self.lines))
+        return days, line_idx
+
+    def flags(self, start_date, end_date, lines=None, threshold=ANOMALY_THRESHOLD):
+        """Flagged (day, Line, metric) values in the range, largest |z| first"""
+        days, line_idx = self._select(start_date, end_date, lines)
+        z = self.z[np.ix_(days, line_idx)]
+        with np.errstate(invalid='ignore'):
+            day, line, metric = np.nonzero(np.abs(z) >= threshold)
+        score = z[day, line, metric]
+        cell = (days[day], line_idx[line], metric)
+        table = pd.DataFrame({
+            'Date': pd.DatetimeIndex(self.dates[days[day]].astype('datetime64[ns]')),
+            'Line': np.asarray(self.lines, dtype=object)[line_idx[line]],
+            'Metric': np.asarray(ANOMALY_METRICS, dtype=object)[metric],
+            'Value': self.values[cell],
+            'Baseline': self.baseline[cell],
+            'Z': score,
+            'Direction': np.where(score > 0, 'high', 'low'),
+        })
+        return table.iloc[np.argsort(-np.abs(score), kind='stable')].reset_index(drop=True)
+
+    def scores(self, start_date, end_date, lines=None):
+        """Highest |z| over the metrics per Line (rows) and day (columns) in the range"""
+        days, line_idx = self._select(start_date, end_date, lines)
+        z = np.abs(self.z[np.ix_(days, line_idx)])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            worst = np.nanmax(z, axis=-1) if z.size else np.empty((len(days), len(line_idx)))
+        return pd.DataFrame(
+            worst.T,
+            index=pd.Index(np.asarray(self.lines, dtype=object)[line_idx], name='Line'),
+            columns=pd.DatetimeIndex(self.dates[days].astype('datetime64[ns]'), name='Date'),
+        )
+
+    def line_summary(self, start_date, end_date, lines=None, threshold=ANOMALY_THRESHOLD):
+        """Flagged days per Line and metric in the range, Lines with the most flagged days first"""
+        days, line_idx = self._select(start_date, end_date, lines)
+        z = np.abs(self.z[np.ix_(days, line_idx)])
+        with np.errstate(invalid='ignore'):
+            flagged = z >= threshold
+        summary = pd.DataFrame(flagged.sum(axis=0), columns=ANOMALY_METRICS)
+        summary.insert(0, 'Line', np.asarray(self.lines, dtype=object)[line_idx])
+        summary.insert(1, 'Flagged_Days', flagged.any(axis=-1).sum(axis=0))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            summary['Max_Abs_Z'] = np.nanmax(z, axis=(0, 2)) if len(days) else np.nan
+        summary['Flagged_Last_Day'] = flagged[-1].any(axis=-1) if len(days) else False
+        return summary.sort_values(['Flagged_Days', 'Max_Abs_Z'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+class AnomalyCache:
+    """One AnomalyDetector for all Lines, brought up to date with each new data version"""
+
+    def __init__(self, window=ANOMALY_WINDOW, min_periods=ANOMALY_MIN_PERIODS):
+        self.detector = AnomalyDetector(window, min_periods)
+
+    def get(self, store, start_date, end_date, lines=None, threshold=ANOMALY_THRESHOLD):
+        """Flags, per-Line summary and score grid of the filter for the store's data"""
+        detector = self.detector
+        # Tables are read under the detector's lock, so a concurrent update never shows half-way
+        with detector.lock:
+            if detector.version != store.version:
+                detector.update(store.cube)
+                detector.version = store.version
+            return {
+                'flags': detector.flags(start_date, end_date, lines, threshold),
+                'line_summary': detector.line_summary(start_date, end_date, lines, threshold),
+                'scores': detector.scores(start_date, end_date, lines),
+            }
@@ -0,0 +1,267 @@
+"""Headless query API: the dashboard's numbers as JSON or Arrow, without a browser.
+
+The API answers from the same data store, cube and cached queries as the
+Streamlit page (see ``queries``). Run it standalone::
+
+    python api.py serve --port 8502
+
+or set ``DASHBOARD_API_PORT`` and the Streamlit process starts it on a
+background thread, sharing its store, source watcher and result cache with
+the page. One-off queries for batch jobs go through the same code::
+
+    python api.py analytics --start 2025-06-01 --end 2025-06-30 --line L01
+    python api.py timeseries --period weekly --format arrow --output weekly.arrow
+
+Endpoints (GET)::
+
+    /health
+    /lines
+    /analytics?start=YYYY-MM-DD&end=YYYY-MM-DD&line=L01&line=L02&format=json|arrow
+    /timeseries/{daily|weekly|monthly}?start=...&end=...&line=...&format=json|arrow
+
+``start``/``end`` default to the full data range and ``line`` to all
+lines. Queries run in a thread pool, so a slow query does not hold up the
+event loop and other requests are served concurrently.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import queries
+from ingest import DATA_DIR
+from result_cache import ResultCache
+from store import load_store
+from watcher import SourceWatcher
+
+API_HOST = os.environ.get('DASHBOARD_API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('DASHBOARD_API_PORT', '0')) or None
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PERIODS = {'daily': 'daily_stats', 'weekly': 'weekly_stats', 'monthly': 'monthly_stats'}
+
+
+class QueryService:
+    """The current data store and the result cache the API answers from"""
+
+    def __init__(self, get_store, result_cache):
+        self.get_store = get_store
+        self.result_cache = result_cache
+
+    @classmethod
+    def standalone(cls, data_dir=DATA_DIR, watch=True):
+        """A service with its own source watcher, store and result cache"""
+        watcher = SourceWatcher(data_dir)
+        if watch:
+            watcher.start()
+        lock = threading.Lock()
+        loaded = {}
+
+        def get_store():
+            # Reload only when the watcher saw new data
+            with lock:
+                if loaded.get('version') != watcher.version:
+                    loaded['store'] = load_store(data_dir, watcher.version)
+                    loaded['version'] = watcher.version
+                return loaded['store']
+
+        return cls(get_store, ResultCache(maxsize=256))
+
+    def resolve(self, start_date=None, end_date=None, lines=None):
+        """Store and filter with defaults filled in; raises ValueError for unknown lines"""
+        store = self.get_store()
+        dates = store.cube.dates
+        if start_date is None:
+            start_date = dates[0].astype(object) if len(dates) else date.today()
+        if end_date is None:
+            end_date = dates[-1].astype(object) if len(dates) else date.today()
+        if end_date < start_date:
+            raise ValueError("end must not be before start")
+        lines = queries.normalize_lines(lines)
+        unknown = set(lines or ()) - set(store.cube.lines)
+        if unknown:
+            raise ValueError(f"Unknown line: {', '.join(sorted(unknown))}")
+        return store, start_date, end_date, lines
+
+    def analytics(self, start_date=None, end_date=None, lines=None, fmt='json'):
+        """Analytics of the filter as (body, media type)"""
+        store, start_date, end_date, lines = self.resolve(start_date, end_date, lines)
+        result = queries.analytics(store, self.result_cache, start_date, end_date, lines)
+        metrics = {key: _to_python(value) for key, value in result.items() if key != 'line_performance'}
+        header = _header(store, start_date, end_date, lines)
+        if fmt == 'arrow':
+            return _arrow_bytes(result['line_performance'], {**header, 'metrics': metrics}), ARROW_MEDIA_TYPE
+        body = {**header, 'metrics': metrics, 'line_performance': _records(result['line_performance'])}
+        return json.dumps(body).encode(), 'application/json'
+
+    def time_series(self, period='daily', start_date=None, end_date=None, lines=None, fmt='json'):
+        """Daily, weekly or monthly series of the filter as (body, media type)"""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period: {period} (use {', '.join(PERIODS)})")
+        store, start_date, end_date, lines = self.resolve(start_date, end_date, lines)
+        series = queries.time_series(store, self.result_cache, start_date, end_date, lines)
+        frame = series.get(PERIODS[period], pd.DataFrame())
+        header = {**_header(store, start_date, end_date, lines), 'period': period}
+        if fmt == 'arrow':
+            return _arrow_bytes(frame, header), ARROW_MEDIA_TYPE
+        return json.dumps({**header, 'rows': _records(frame)}).encode(), 'application/json'
+
+
+def _to_python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _header(store, start_date, end_date, lines):
+    return {
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'lines': list(lines) if lines else None,
+        'data_version': store.version,
+    }
+
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso')) if not df.empty else []
+
+
+def _arrow_bytes(df, metadata):
+    """Arrow IPC stream of ``df``, with ``metadata`` as JSON in the schema metadata"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), b'dashboard': json.dumps(metadata).encode()
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _parse_date(value, name):
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date") from None
+
+
+def _parse_format(value):
+    fmt = value or 'json'
+    if fmt not in ('json', 'arrow'):
+        raise ValueError("format must be json or arrow")
+    return fmt
+
+
+def create_app(service):
+    """ASGI app answering from ``service``"""
+
+    async def run_query(request, query, *args):
+        params = request.query_params
+        try:
+            body, media_type = await run_in_threadpool(
+                query, *args,
+                _parse_date(params.get('start'), 'start'),
+                _parse_date(params.get('end'), 'end'),
+                params.getlist('line') or None,
+                _parse_format(params.get('format')),
+            )
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        return Response(body, media_type=media_type)
+
+    async def health(request):
+        store = await run_in_threadpool(service.get_store)
+        return JSONResponse({
+            'status': 'ok',
+            'data_version': store.version,
+            'rows': {table: len(df) for table, df in store.tables.items()},
+            'cache': service.result_cache.stats(),
+        })
+
+    async def lines(request):
+        store = await run_in_threadpool(service.get_store)
+        dates = store.cube.dates
+        return JSONResponse({
+            'lines': list(store.cube.lines),
+            'start': str(dates[0]) if len(dates) else None,
+            'end': str(dates[-1]) if len(dates) else None,
+        })
+
+    async def analytics(request):
+        return await run_query(request, service.analytics)
+
+    async def time_series(request):
+        return await run_query(request, service.time_series, request.path_params['period'])
+
+    return Starlette(routes=[
+        Route('/health', health),
+        Route('/lines', lines),
+        Route('/analytics', analytics),
+        Route('/timeseries/{period}', time_series),
+    ])
+
+
+def serve(service, host=API_HOST, port=8502):
+    uvicorn.run(create_app(service), host=host, port=port, log_level='info')
+
+
+def start_in_background(service, host=API_HOST, port=API_PORT):
+    """Serve the API from a daemon thread of the current process"""
+    server = uvicorn.Server(uvicorn.Config(create_app(service), host=host, port=port, log_level='warning'))
+    threading.Thread(target=server.run, name='query-api', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dashboard query API")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="run the HTTP API")
+    serve_parser.add_argument('--host', default=API_HOST)
+    serve_parser.add_argument('--port', type=int, default=API_PORT or 8502)
+
+    for name in ('analytics', 'timeseries'):
+        query_parser = commands.add_parser(name, help=f"print {name} for a filter")
+        query_parser.add_argument('--start', type=date.fromisoformat)
+        query_parser.add_argument('--end', type=date.fromisoformat)
+        query_parser.add_argument('--line', action='append')
+        query_parser.add_argument('--format', choices=['json', 'arrow'], default='json')
+        query_parser.add_argument('--output', help="file to write to (default: stdout)")
+        if name == 'timeseries':
+            query_parser.add_argument('--period', choices=list(PERIODS), default='daily')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(QueryService.standalone(args.data_dir), args.host, args.port)
+        return 0
+
+    service = QueryService.standalone(args.data_dir, watch=False)
+    try:
+        if args.command == 'analytics':
+            body, _ = service.analytics(args.start, args.end, args.line, args.format)
+        else:
+            body, _ = service.time_series(args.period, args.start, args.end, args.line, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body + (b'\n' if args.format == 'json' else b''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,29 @@
 import streamlit as st
+import functools
 import hashlib
+import logging
+import os
 import time
+import uuid
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from ingest import DATA_DIR
+from currency import BASE_CURRENCY, RATES_FILE, latest_rates, load_rate_table
+import queries
+from analytics import COMPARISON_MODES, comparison_modes, comparison_range, kpi_table, metrics_table
+from anomalies import ANOMALY_THRESHOLD, ANOMALY_WINDOW, AnomalyCache
+from cohorts import CohortCache
+from charts import FIGURE_CACHE, POINT_BUDGET, figure
+from members import member_daily, weighted_winrate
+from export import FORMATS, ROW_TABLES, XLSX_MAX_ROWS, ExportCache, export_file_name
+from store import load_store
+from result_cache import ResultCache
+from watcher import SourceWatcher
+from api import API_PORT, QueryService, start_in_background
+from profiling import PROFILER
 
 # Konfigurasi halaman
 st.set_page_config(
@@ -16,49 +33,74 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Cache untuk loading data
-@st.cache_data
-def load_real_data():
-    """Load real data from Excel files"""
-    try:
-        # Load data dari file Excel
-        deposit_df = pd.read_excel('deposit_july06.xlsx')
-        withdraw_df = pd.read_excel('withdrawjuly06.xlsx')
-        member_df = pd.read_excel('member_reportJanJuly06.xlsx')
-        
-        # Konversi kolom Date ke datetime
-        deposit_df['Date'] = pd.to_datetime(deposit_df['Date'])
-        withdraw_df['Date'] = pd.to_datetime(withdraw_df['Date'])
-        member_df['Date'] = pd.to_datetime(member_df['Date'])
-        
-        # Currency conversion SGD to MYR
-        # Standard exchange rate: 1 SGD = 3.4 MYR (approximate)
-        SGD_TO_MYR_RATE = 3.4
-        
-        # Define columns that need currency conversion
-        currency_columns = [
-            'Deposit_Amount', 'Withdraw_Amount', 'Bonus', 'Add_Bonus', 'Deduct_Bonus',
-            'Add_Transaction', 'Deduct_Transaction', 'Bets_Amount', 'Valid_Amount', 
-            'GGR', 'Net_Profit'
-        ]
-        
-        # Convert SGD to MYR in all dataframes
-        for df in [deposit_df, withdraw_df, member_df]:
-            if 'Currency' in df.columns:
-                sgd_mask = df['Currency'] == 'SGD'
-                
-                # Convert all currency columns from SGD to MYR
-                for col in currency_columns:
-                    if col in df.columns:
-                        df.loc[sgd_mask, col] = df.loc[sgd_mask, col] * SGD_TO_MYR_RATE
-                
-                # Update currency label to MYR
-                df.loc[sgd_mask, 'Currency'] = 'MYR'
-        
-        return deposit_df, withdraw_df, member_df
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+# Dashboard log (section render timings); the script reruns, so the handler is added once
+logger = logging.getLogger('dashboard')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get('DASHBOARD_LOG_LEVEL', 'INFO'))
+
+# Daily exchange rates to MYR
+@st.cache_data(max_entries=1)
+def load_fx_rates(rates_file=RATES_FILE, data_version=0):
+    """Load the exchange rate table"""
+    return load_rate_table(rates_file)
+
+# Shared data store: one read-only copy of the frames and the cube for all sessions,
+# rebuilt only when the source watcher reports a new data version
+@st.cache_resource(max_entries=1)
+def load_data_store(data_dir=DATA_DIR, data_version=0):
+    """Load the data once per process and share it across sessions.
+
+    The exports are read as the source watcher ingested them, converted to MYR
+    and downcast to the compact schema. Errors are raised, so a failed load is
+    never cached.
+    """
+    return load_store(data_dir, data_version, load_fx_rates(data_version=data_version), ingest=False)
+
+# Background watcher for the export files and the rate table
+# (its first poll is left to the page: a cached resource must not draw the progress bar,
+# Streamlit would replay it into a placeholder of an earlier run)
+@st.cache_resource
+def get_source_watcher(data_dir=DATA_DIR):
+    """Start the process-wide source watcher"""
+    return SourceWatcher(data_dir, initial_check=False).start()
+
+def ingest_progress(placeholder):
+    """Progress callback that shows parsing of new export files in ``placeholder``"""
+    def progress(done, total, name):
+        text = f"📥 Parsing {total} new export file(s)..." if name is None else f"📥 Parsed {name} ({done}/{total})"
+        placeholder.progress(done / total, text=text)
+    return progress
+
+# Auto refresh: a tiny fragment polls the watcher, the page only reruns on new data
+AUTO_REFRESH_INTERVAL = 30
+
+@st.fragment(run_every=AUTO_REFRESH_INTERVAL)
+def auto_refresh_check():
+    watcher = get_source_watcher()
+    if watcher.version != st.session_state.get('data_version'):
+        st.rerun()
+    if watcher.last_change:
+        st.caption(f"🕒 Data updated {watcher.last_change.strftime('%d/%m/%Y %H:%M:%S')}")
+
+# Analytics results shared by all sessions, keyed by filter and data version
+@st.cache_resource
+def get_result_cache():
+    """Process-wide LRU cache of analytics results"""
+    cache = ResultCache(maxsize=256)
+    PROFILER.watch_cache('analytics', cache.stats)
+    return cache
+
+# Optional query API inside this process (DASHBOARD_API_PORT), answering from the
+# same store, watcher and result cache as the page (a request polls the watcher, which only
+# stats the sources unless they changed)
+@st.cache_resource
+def start_query_api():
+    """Start the query API on a background thread"""
+    service = QueryService(lambda: load_data_store(DATA_DIR, get_source_watcher().poll()), get_result_cache())
+    return start_in_background(service)
 
 # Simple CSS
 def load_css():
@@ -124,103 +166,6 @@ def verify_login(username, password):
     hashed_password = hash_password(password)
     return username in USERS and USERS[username] == hashed_password
 
-# Calculate comprehensive analytics
-def calculate_comprehensive_analytics(deposit_df, withdraw_df, member_df):
-    """Calculate comprehensive financial analytics"""
-    
-    analytics = {}
-    
-    # Basic Financial Metrics
-    analytics['total_deposit'] = deposit_df['Deposit_Amount'].sum() if not deposit_df.empty else 0
-    analytics['total_withdraw'] = withdraw_df['Withdraw_Amount'].sum() if not withdraw_df.empty else 0
-    analytics['total_deposit_cases'] = deposit_df['Deposit_Cases'].sum() if not deposit_df.empty else 0
-    analytics['total_withdraw_cases'] = withdraw_df['Withdraw_Cases'].sum() if not withdraw_df.empty else 0
-    
-    # GGR and Net Profit
-    analytics['total_ggr'] = member_df['GGR'].sum() if not member_df.empty else 0
-    analytics['total_net_profit'] = member_df['Net_Profit'].sum() if not member_df.empty else 0
-    
-    # Betting Analytics
-    analytics['total_bets'] = member_df['Cases_Bets'].sum() if not member_df.empty else 0
-    analytics['total_bets_amount'] = member_df['Bets_Amount'].sum() if not member_df.empty else 0
-    analytics['total_valid_amount'] = member_df['Valid_Amount'].sum() if not member_df.empty else 0
-    
-    # Bonus Analytics
-    analytics['total_bonus_given'] = member_df['Add_Bonus'].sum() if not member_df.empty else 0
-    analytics['total_bonus_deducted'] = member_df['Deduct_Bonus'].sum() if not member_df.empty else 0
-    analytics['net_bonus'] = analytics['total_bonus_given'] - analytics['total_bonus_deducted']
-    
-    # Active Members
-    analytics['total_active_members'] = member_df['User_Name'].nunique() if not member_df.empty else 0
-    
-    # Average Metrics
-    analytics['avg_deposit_per_case'] = analytics['total_deposit'] / analytics['total_deposit_cases'] if analytics['total_deposit_cases'] > 0 else 0
-    analytics['avg_withdraw_per_case'] = analytics['total_withdraw'] / analytics['total_withdraw_cases'] if analytics['total_withdraw_cases'] > 0 else 0
-    analytics['avg_ggr_per_member'] = analytics['total_ggr'] / analytics['total_active_members'] if analytics['total_active_members'] > 0 else 0
-    
-    # Win Rate
-    analytics['overall_winrate'] = member_df['Winrate'].mean() if not member_df.empty else 0
-    
-    # Line Performance
-    if not member_df.empty:
-        analytics['line_performance'] = member_df.groupby('Line').agg({
-            'GGR': 'sum',
-            'Net_Profit': 'sum',
-            'Deposit_Amount': 'sum',
-            'Withdraw_Amount': 'sum',
-            'User_Name': 'nunique'
-        }).reset_index()
-    else:
-        analytics['line_performance'] = pd.DataFrame()
-    
-    return analytics
-
-# Generate time series data
-def generate_time_series_analytics(deposit_df, withdraw_df, member_df):
-    """Generate time series analytics for charts"""
-    
-    time_series = {}
-    
-    if not member_df.empty:
-        # Daily aggregations
-        daily_stats = member_df.groupby(member_df['Date'].dt.date).agg({
-            'GGR': 'sum',
-            'Net_Profit': 'sum',
-            'Deposit_Amount': 'sum',
-            'Withdraw_Amount': 'sum',
-            'Cases_Bets': 'sum',
-            'Bets_Amount': 'sum',
-            'Valid_Amount': 'sum',
-            'User_Name': 'nunique'
-        }).reset_index()
-        
-        time_series['daily_stats'] = daily_stats
-        
-        # Weekly aggregations
-        member_df['Week'] = member_df['Date'].dt.isocalendar().week
-        weekly_stats = member_df.groupby('Week').agg({
-            'GGR': 'sum',
-            'Net_Profit': 'sum',
-            'Deposit_Amount': 'sum',
-            'Withdraw_Amount': 'sum',
-            'User_Name': 'nunique'
-        }).reset_index()
-        
-        time_series['weekly_stats'] = weekly_stats
-        
-        # Monthly aggregations
-        monthly_stats = member_df.groupby('Month').agg({
-            'GGR': 'sum',
-            'Net_Profit': 'sum',
-            'Deposit_Amount': 'sum',
-            'Withdraw_Amount': 'sum',
-            'User_Name': 'nunique'
-        }).reset_index()
-        
-        time_series['monthly_stats'] = monthly_stats
-    
-    return time_series
-
 # Login page
 def login_page():
     load_css()
@@ -242,7 +187,7 @@ def login_page():
             
             if login_clicked:
                 if username and password:
-                    with st.spinner('Memverifikasi...'):
+                    with PROFILER.stage('login_verify'), st.spinner('Memverifikasi...'):
                         time.sleep(1)
                         
                     if verify_login(username, password):
@@ -250,7 +195,8 @@ def login_page():
                         st.session_state.username = username
                         st.session_state.login_time = datetime.now()
                         st.success("✅ Login berhasil!")
-                        time.sleep(1)
+                        with PROFILER.stage('login_redirect'):
+                            time.sleep(1)
                         st.rerun()
                     else:
                         st.error("❌ Username atau password salah!")
@@ -267,164 +213,113 @@ def login_page():
         </div>
         """, unsafe_allow_html=True)
 
-# Dashboard page
-def dashboard_page():
-    load_css()
-    
-    # Sidebar
-    with st.sidebar:
-        st.markdown(f"### 👋 Welcome, {st.session_state.username}!")
-        st.markdown(f"**Login:** {st.session_state.login_time.strftime('%d/%m/%Y %H:%M')}")
-        
-        if st.button("🔄 Refresh"):
-            st.rerun()
-        
-        # Export functionality
-        if st.button("📥 Export Data"):
-            st.info("💾 Export functionality coming soon!")
-        
-        # Auto-refresh toggle
-        auto_refresh = st.checkbox("🔄 Auto Refresh (30s)")
-        if auto_refresh:
-            time.sleep(30)
-            st.rerun()
-        
-        # Theme selector
-        theme = st.selectbox("🎨 Theme", ["Dark", "Light"])
-        if theme == "Light":
-            st.info("🌞 Light theme selected")
-        
-        if st.button("🚪 Logout"):
-            for key in ['logged_in', 'username', 'login_time']:
-                if key in st.session_state:
-                    del st.session_state[key]
-            st.rerun()
-    
-    # Header
-    st.markdown('<h1 style="text-align: center; color: white;">🎮 Gaming Platform Dashboard</h1>', unsafe_allow_html=True)
-    
-    # Load real data first to get available lines
-    deposit_df, withdraw_df, member_df = load_real_data()
-    
-    # Get date range from data
-    if not member_df.empty:
-        min_date = member_df['Date'].min().date()
-        max_date = member_df['Date'].max().date()
-        
-        # Set default to show last 30 days of data or full range if less than 30 days
-        if (max_date - min_date).days <= 30:
-            default_start_date = min_date
-            default_end_date = max_date
-        else:
-            default_start_date = max_date - timedelta(days=30)
-            default_end_date = max_date
-    else:
-        min_date = datetime.now().date() - timedelta(days=30)
-        max_date = datetime.now().date()
-        default_start_date = min_date
-        default_end_date = max_date
-    
-    # Get available lines from data
-    available_lines = ["All"]
-    if not member_df.empty:
-        unique_lines = sorted(member_df['Line'].unique())
-        available_lines.extend(unique_lines)
-    
-    # Filters
-    st.markdown("## 🔍 Filters")
-    
-    # Show data date range info
-    if not member_df.empty:
-        st.info(f"📅 **Data Available**: {min_date.strftime('%d %B %Y')} to {max_date.strftime('%d %B %Y')} ({(max_date - min_date).days + 1} days)")
+# Dashboard sections. Each one is a fragment that only depends on its own
+# arguments, so a widget inside a section reruns just that section.
+def dashboard_section(name):
+    """Render the decorated function as a fragment and log its render time"""
+    def decorator(func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                # A section rerunning on its own is profiled as a run of its own
+                with PROFILER.stage(f"section {name}", st.session_state.get('session_id')):
+                    return func(*args, **kwargs)
+            finally:
+                logger.info("section %s rendered in %.1f ms", name, (time.perf_counter() - started) * 1000)
+        return st.fragment(timed)
+    return decorator
+
+@dashboard_section("Currency Information")
+def currency_information_section(store, start_date, end_date, selected_lines):
+    st.markdown("## 💱 Currency Information")
+    
+    # Show currency conversion info (breakdown by original currency comes from the cube)
+    rates = load_fx_rates(data_version=store.version)
+    currency_breakdown = store.cube.currency_breakdown(start_date, end_date, selected_lines)
+    fx_rates = latest_rates(rates)
+    converted = [code for code in currency_breakdown['Currency'] if code != BASE_CURRENCY]
+    rate_text = ", ".join(f"1 {code} = {fx_rates[code]:g} MYR" for code in converted if code in fx_rates) or "No conversion needed"
+    rate_source = "Daily Rate Table" if not rates.empty else "Standard Rate"
+    st.info(f"💰 **All amounts are displayed in MYR**. Other currencies have been converted using exchange rate: **{rate_text}**")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        start_date = st.date_input(
-            "📅 Start Date", 
-            value=default_start_date,
-            min_value=min_date,
-            max_value=max_date
-        )
-        end_date = st.date_input(
-            "📅 End Date", 
-            value=default_end_date,
-            min_value=min_date,
-            max_value=max_date
+        records = currency_breakdown['Records'].sum()
+        if records > 0:
+            shares = currency_breakdown['Records'] / records
+            distribution = " / ".join(f"{share:.0%} {code}" for code, share in zip(currency_breakdown['Currency'], shares))
+        else:
+            # No Currency column in the exports, or no member rows in the range
+            distribution = "-"
+        st.metric(
+            label="📊 Currency Distribution",
+            value=distribution,
+            delta="Before conversion"
         )
     
     with col2:
-        selected_line = st.selectbox("🎮 Line:", available_lines)
-        if st.button("🔄 Apply Filters"):
-            st.rerun()
+        st.metric(
+            label="💹 Exchange Rate Used",
+            value=rate_text,
+            delta=rate_source
+        )
     
-    # Filter by date range
-    if start_date and end_date:
-        deposit_df = deposit_df[(deposit_df['Date'].dt.date >= start_date) & (deposit_df['Date'].dt.date <= end_date)]
-        withdraw_df = withdraw_df[(withdraw_df['Date'].dt.date >= start_date) & (withdraw_df['Date'].dt.date <= end_date)]
-        member_df = member_df[(member_df['Date'].dt.date >= start_date) & (member_df['Date'].dt.date <= end_date)]
+    if not currency_breakdown.empty:
+        display_currency = currency_breakdown.rename(columns={
+            'Deposit_Amount': 'Deposit (RM)',
+            'Withdraw_Amount': 'Withdraw (RM)',
+            'GGR': 'GGR (RM)',
+            'Deposit_Amount_Original': 'Deposit (Original)',
+            'Withdraw_Amount_Original': 'Withdraw (Original)',
+            'GGR_Original': 'GGR (Original)'
+        })
+        st.dataframe(display_currency.round(2), use_container_width=True)
+
+@dashboard_section("Line Information")
+def line_information_section(store, start_date, end_date, selected_lines):
+    st.markdown("## 📊 Line Information")
     
-    # Filter by line
-    if selected_line != "All":
-        deposit_df = deposit_df[deposit_df['Line'] == selected_line] if 'Line' in deposit_df.columns else deposit_df
-        withdraw_df = withdraw_df[withdraw_df['Line'] == selected_line] if 'Line' in withdraw_df.columns else withdraw_df
-        member_df = member_df[member_df['Line'] == selected_line] if 'Line' in member_df.columns else member_df
+    # Show line distribution
+    line_counts = store.cube.by_line('member', start_date, end_date, selected_lines)[['Line', 'Records']]
+    line_counts = line_counts.sort_values('Records', ascending=False, ignore_index=True)
     
-    # Calculate comprehensive analytics
-    analytics = calculate_comprehensive_analytics(deposit_df, withdraw_df, member_df)
+    col1, col2 = st.columns([1, 2])
     
-    # Display line selection info
-    if not member_df.empty:
-        # Currency conversion info
-        st.markdown("## 💱 Currency Information")
-        
-        # Show currency conversion info
-        currency_counts = member_df['Currency'].value_counts()
-        st.info(f"💰 **All amounts are displayed in MYR**. SGD amounts have been converted using exchange rate: **1 SGD = 3.4 MYR**")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric(
-                label="📊 Currency Distribution",
-                value="100% MYR",
-                delta="After conversion"
-            )
-        
-        with col2:
-            st.metric(
-                label="💹 Exchange Rate Used",
-                value="1 SGD = 3.4 MYR",
-                delta="Standard Rate"
-            )
-        
-        st.markdown("## 📊 Line Information")
-        
-        # Show line distribution
-        line_counts = member_df['Line'].value_counts().reset_index()
-        line_counts.columns = ['Line', 'Records']
-        
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            st.markdown("### 📋 Line Distribution")
-            st.dataframe(line_counts, use_container_width=True)
-        
-        with col2:
-            st.markdown("### 📈 Line Records Chart")
-            fig = px.bar(line_counts, x='Line', y='Records', title="Records per Line")
-            fig.update_xaxes(tickangle=45)
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Show currently selected line info
-        if selected_line != "All":
-            selected_records = len(member_df)
-            st.info(f"🎯 **Currently viewing Line: {selected_line}** with **{selected_records:,} records**")
-        else:
-            total_records = len(member_df)
-            st.info(f"🎯 **Currently viewing: All Lines** with **{total_records:,} total records**")
+    with col1:
+        st.markdown("### 📋 Line Distribution")
+        st.dataframe(line_counts, use_container_width=True)
     
-    # Key Metrics
+    with col2:
+        st.markdown("### 📈 Line Records Chart")
+        fig = figure('bar', line_counts, layout={'xaxes': {'tickangle': 45}}, x='Line', y='Records', title="Records per Line")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # Show currently selected line info
+    member_records = line_counts['Records'].sum()
+    if selected_lines is not None:
+        selected_line = selected_lines[0]
+        selected_records = member_records
+        st.info(f"🎯 **Currently viewing Line: {selected_line}** with **{selected_records:,} records**")
+    else:
+        total_records = member_records
+        st.info(f"🎯 **Currently viewing: All Lines** with **{total_records:,} total records**")
+
+def metric_delta(analytics, comparison, key, points=False):
+    """st.metric delta of ``key`` against the comparison period (None without one)"""
+    if comparison is None:
+        return None
+    current, previous = analytics[key], comparison['metrics'][key]
+    change = current - previous
+    if points:
+        return f"{change * 100:+.2f} pp vs {comparison['label']}"
+    if previous:
+        return f"{change / abs(previous):+.1%} vs {comparison['label']}"
+    return f"{change:+,.2f} vs {comparison['label']}"
+
+@dashboard_section("Key Metrics")
+def key_metrics_section(analytics, comparison=None):
     st.markdown("## 📊 Key Metrics")
     
     col1, col2, col3, col4 = st.columns(4)
@@ -433,74 +328,99 @@ def dashboard_page():
         st.metric(
             label="💰 Total Deposit",
             value=f"RM {analytics['total_deposit']:,.2f}",
-            delta=f"Cases: {analytics['total_deposit_cases']}"
+            delta=metric_delta(analytics, comparison, 'total_deposit'),
+            help=f"Cases: {analytics['total_deposit_cases']:,}"
         )
     
     with col2:
         st.metric(
             label="💸 Total Withdraw", 
             value=f"RM {analytics['total_withdraw']:,.2f}",
-            delta=f"Cases: {analytics['total_withdraw_cases']}"
+            delta=metric_delta(analytics, comparison, 'total_withdraw'),
+            delta_color="inverse",
+            help=f"Cases: {analytics['total_withdraw_cases']:,}"
         )
     
     with col3:
         st.metric(
             label="🆔 Active Members",
             value=f"{analytics['total_active_members']:,}",
-            delta="Total"
+            delta=metric_delta(analytics, comparison, 'total_active_members')
         )
     
     with col4:
-        ggr_color = "normal" if analytics['total_ggr'] >= 0 else "inverse"
         st.metric(
             label="💹 GGR",
             value=f"RM {analytics['total_ggr']:,.2f}",
-            delta="Gross Gaming Revenue",
-            delta_color=ggr_color
+            delta=metric_delta(analytics, comparison, 'total_ggr'),
+            help="Gross Gaming Revenue"
         )
-    
-    # Charts
+
+@dashboard_section("Weekly Analytics")
+def weekly_analytics_section(store, start_date, end_date, selected_lines):
     st.markdown("## 📈 Weekly Analytics")
     
-    col1, col2 = st.columns(2)
+    # Daily/weekly/monthly series from the cube, memoized per filter like the analytics
+    time_series = queries.time_series(store, get_result_cache(), start_date, end_date, selected_lines)
     
-    with col1:
-        st.markdown("### 💰 Total Deposit per Week")
+    if time_series:
+        weekly_stats = time_series['weekly_stats']
+        col1, col2 = st.columns(2)
         
-        # Generate dummy data for weekly deposit chart
-        weeks = ['Week 1', 'Week 2', 'Week 3', 'Week 4']
-        base_deposit = analytics['total_deposit']
-        deposit_data = pd.DataFrame({
-            'Week': weeks,
-            'Deposit (RM)': [
-                base_deposit * 0.7,
-                base_deposit * 0.8,
-                base_deposit * 0.9,
-                base_deposit * 1.0
-            ]
-        })
+        # The deposit or withdraw columns are missing when that table has no data
+        with col1:
+            st.markdown("### 💰 Total Deposit per Week")
+            if 'Total_Deposit' in weekly_stats.columns:
+                deposit_data = weekly_stats[['Week', 'Total_Deposit']].rename(columns={'Total_Deposit': 'Deposit (RM)'})
+                st.bar_chart(deposit_data.set_index('Week'))
+                st.dataframe(deposit_data, use_container_width=True)
+            else:
+                st.info("No deposit data available")
         
-        st.bar_chart(deposit_data.set_index('Week'))
-        st.dataframe(deposit_data, use_container_width=True)
-    
-    with col2:
-        st.markdown("### 💸 Total Withdraw per Week")
+        with col2:
+            st.markdown("### 💸 Total Withdraw per Week")
+            if 'Total_Withdraw' in weekly_stats.columns:
+                withdraw_data = weekly_stats[['Week', 'Total_Withdraw']].rename(columns={'Total_Withdraw': 'Withdraw (RM)'})
+                st.bar_chart(withdraw_data.set_index('Week'))
+                st.dataframe(withdraw_data, use_container_width=True)
+            else:
+                st.info("No withdraw data available")
         
-        # Generate dummy data for weekly withdraw chart
-        base_withdraw = analytics['total_withdraw']
-        withdraw_data = pd.DataFrame({
-            'Week': weeks,
-            'Withdraw (RM)': [
-                base_withdraw * 0.7,
-                base_withdraw * 0.8,
-                base_withdraw * 0.9,
-                base_withdraw * 1.0
-            ]
-        })
+        # Daily trends
+        st.markdown("### 📅 Daily Trends")
+        daily_stats = time_series['daily_stats']
+        col1, col2 = st.columns(2)
         
-        st.bar_chart(withdraw_data.set_index('Week'))
-        st.dataframe(withdraw_data, use_container_width=True)
-    
+        with col1:
+            # Both daily charts are built from the same cached series, downsampled for long ranges
+            fig_daily = figure(
+                'line',
+                daily_stats,
+                max_points=POINT_BUDGET,
+                x='Date',
+                y=['GGR', 'Net_Profit'],
+                title="Daily GGR & Net Profit (RM)",
+                markers=True
+            )
+            st.plotly_chart(fig_daily, use_container_width=True)
+        
+        with col2:
+            fig_members = figure(
+                'line',
+                daily_stats,
+                max_points=POINT_BUDGET,
+                x='Date',
+                y='User_Name',
+                title="Daily Active Members",
+                labels={'User_Name': 'Active Members'},
+                markers=True
+            )
+            st.plotly_chart(fig_members, use_container_width=True)
+    else:
+        st.info("No data available for the selected period")
+
+@dashboard_section("Financial Analytics")
+def financial_analytics_section(analytics, comparison=None):
     # Additional Financial Metrics
     st.markdown("## 💼 Financial Analytics")
     
@@ -510,28 +430,31 @@ def dashboard_page():
         st.metric(
             label="🏆 Net Profit",
             value=f"RM {analytics['total_net_profit']:,.2f}",
-            delta="Total"
+            delta=metric_delta(analytics, comparison, 'total_net_profit')
         )
     
     with col2:
         st.metric(
             label="🎯 Total Bets",
             value=f"{analytics['total_bets']:,}",
-            delta=f"Amount: RM {analytics['total_bets_amount']:,.2f}"
+            delta=metric_delta(analytics, comparison, 'total_bets'),
+            help=f"Amount: RM {analytics['total_bets_amount']:,.2f}"
         )
     
     with col3:
         st.metric(
             label="✅ Valid Amount",
             value=f"RM {analytics['total_valid_amount']:,.2f}",
-            delta="Validated"
+            delta=metric_delta(analytics, comparison, 'total_valid_amount')
         )
     
     with col4:
         st.metric(
             label="🎁 Net Bonus",
             value=f"RM {analytics['net_bonus']:,.2f}",
-            delta=f"Given: RM {analytics['total_bonus_given']:,.2f}"
+            delta=metric_delta(analytics, comparison, 'net_bonus'),
+            delta_color="inverse",
+            help=f"Given: RM {analytics['total_bonus_given']:,.2f}"
         )
     
     # Average Metrics
@@ -543,31 +466,37 @@ def dashboard_page():
         st.metric(
             label="📈 Avg Deposit/Case",
             value=f"RM {analytics['avg_deposit_per_case']:,.2f}",
-            delta="Per Transaction"
+            delta=metric_delta(analytics, comparison, 'avg_deposit_per_case'),
+            help="Per Transaction"
         )
     
     with col2:
         st.metric(
             label="📉 Avg Withdraw/Case",
             value=f"RM {analytics['avg_withdraw_per_case']:,.2f}",
-            delta="Per Transaction"
+            delta=metric_delta(analytics, comparison, 'avg_withdraw_per_case'),
+            delta_color="inverse",
+            help="Per Transaction"
         )
     
     with col3:
         st.metric(
             label="👤 Avg GGR/Member",
             value=f"RM {analytics['avg_ggr_per_member']:,.2f}",
-            delta="Per User"
+            delta=metric_delta(analytics, comparison, 'avg_ggr_per_member'),
+            help="Per User"
         )
     
     with col4:
         st.metric(
             label="🎯 Overall Win Rate",
             value=f"{analytics['overall_winrate']:.2%}",
-            delta="Average"
+            delta=metric_delta(analytics, comparison, 'overall_winrate', points=True),
+            help="Average"
         )
-    
-    # Line Performance Analysis
+
+@dashboard_section("Line Performance Analysis")
+def line_performance_section(analytics):
     if not analytics['line_performance'].empty:
         st.markdown("## 📈 Line Performance Analysis")
         
@@ -579,8 +508,9 @@ def dashboard_page():
             
             with col1:
                 st.markdown("### 💹 GGR by Line")
-                fig_ggr = px.bar(
-                    analytics['line_performance'], 
+                fig_ggr = figure(
+                    'bar',
+                    analytics['line_performance'],
                     x='Line', 
                     y='GGR',
                     title="GGR by Line",
@@ -591,8 +521,9 @@ def dashboard_page():
             
             with col2:
                 st.markdown("### 🏆 Net Profit by Line")
-                fig_profit = px.bar(
-                    analytics['line_performance'], 
+                fig_profit = figure(
+                    'bar',
+                    analytics['line_performance'],
                     x='Line', 
                     y='Net_Profit',
                     title="Net Profit by Line",
@@ -606,7 +537,8 @@ def dashboard_page():
             
             with col1:
                 st.markdown("### 💰 Deposit vs Withdraw by Line")
-                fig_dep_with = px.scatter(
+                fig_dep_with = figure(
+                    'scatter',
                     analytics['line_performance'],
                     x='Deposit_Amount',
                     y='Withdraw_Amount',
@@ -619,7 +551,8 @@ def dashboard_page():
             
             with col2:
                 st.markdown("### 👥 Active Users by Line")
-                fig_users = px.pie(
+                fig_users = figure(
+                    'pie',
                     analytics['line_performance'],
                     values='User_Name',
                     names='Line',
@@ -641,8 +574,140 @@ def dashboard_page():
             display_df.columns = ['Line', 'GGR (RM)', 'Net Profit (RM)', 'Deposit Amount (RM)', 'Withdraw Amount (RM)', 'Active Users']
             
             st.dataframe(display_df, use_container_width=True)
+
+# Cohorts: one engine per Line selection, extended with each new data version
+@st.cache_resource
+def get_cohort_cache():
+    """Process-wide cohort engines"""
+    return CohortCache()
+
+@dashboard_section("Cohort & Retention")
+def cohort_section(store, selected_lines):
+    st.markdown("## 👥 Cohort & Retention")
+    st.caption("Cohort = minggu (Senin) pertama member aktif, dihitung dari seluruh history untuk Line yang dipilih")
+    
+    cohorts = get_cohort_cache().get(store, selected_lines)
+    retention = cohorts['retention']
+    if retention.empty:
+        st.info("No member data for the selected line")
+        return
+    activity = cohorts['weekly_activity']
+    lifetime = cohorts['lifetime_ggr']
+    
+    # Week-1 retention over the cohorts whose second week is already in the data
+    sizes = lifetime['Members'].to_numpy()
+    week1 = retention['W1'].to_numpy() if 'W1' in retention.columns else np.full(len(sizes), np.nan)
+    observed = ~np.isnan(week1)
+    week1_retention = (week1[observed] * sizes[observed]).sum() / sizes[observed].sum() if observed.any() else 0
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("👥 Cohorts", f"{len(lifetime):,}")
+    with col2:
+        st.metric("🆕 Members", f"{int(sizes.sum()):,}")
+    with col3:
+        st.metric("🔁 Week-1 Retention", f"{week1_retention:.1%}")
+    with col4:
+        st.metric("📉 Churned (last week)", f"{int(activity['Churned'].iloc[-1]):,}")
+    
+    tab1, tab2, tab3 = st.tabs(["🔥 Retention", "🔄 Weekly Activity", "💰 Lifetime GGR"])
+    
+    with tab1:
+        fig_retention = figure(
+            'heatmap',
+            retention * 100,
+            x=list(retention.columns),
+            y=[cohort.strftime('%Y-%m-%d') for cohort in retention.index],
+            labels={'x': 'Weeks since first seen', 'y': 'Cohort', 'color': 'Retention %'},
+            title="Weekly Retention per Cohort (%)",
+            color_continuous_scale='Blues',
+            aspect='auto'
+        )
+        st.plotly_chart(fig_retention, use_container_width=True)
+    
+    with tab2:
+        fig_activity = figure(
+            'line',
+            activity,
+            x='Week_Start',
+            y=['Active', 'New', 'Retained', 'Reactivated', 'Churned'],
+            title="Members per Week",
+            markers=True
+        )
+        st.plotly_chart(fig_activity, use_container_width=True)
+        st.dataframe(activity, use_container_width=True, hide_index=True)
+    
+    with tab3:
+        fig_lifetime = figure(
+            'bar',
+            lifetime,
+            x='Cohort',
+            y='Lifetime_GGR',
+            title="Lifetime GGR per Cohort (RM)",
+            color='GGR_per_Member',
+            color_continuous_scale='Viridis'
+        )
+        st.plotly_chart(fig_lifetime, use_container_width=True)
+        st.dataframe(lifetime.round(2), use_container_width=True, hide_index=True)
+
+# Anomalies: one detector for all Lines, extended with each new data version
+@st.cache_resource
+def get_anomaly_cache():
+    """Process-wide anomaly detector"""
+    return AnomalyCache()
+
+@dashboard_section("Anomalies")
+def anomaly_section(store, start_date, end_date, selected_lines):
+    st.markdown("## 🚨 Anomaly Detection")
+    st.caption(f"Baseline = median & MAD {ANOMALY_WINDOW} hari sebelumnya per Line; hari ditandai jika |robust z| ≥ threshold")
+    
+    threshold = st.slider("Threshold |z|", min_value=2.0, max_value=8.0, value=ANOMALY_THRESHOLD, step=0.5, key="anomaly_threshold")
+    anomalies = get_anomaly_cache().get(store, start_date, end_date, selected_lines, threshold)
+    flags = anomalies['flags']
+    summary = anomalies['line_summary']
+    scores = anomalies['scores']
+    if scores.empty:
+        st.info("No data for the selected range")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("🚨 Flagged Values", f"{len(flags):,}")
+    with col2:
+        st.metric("📅 Flagged Days", f"{flags['Date'].nunique():,}")
+    with col3:
+        st.metric("🏢 Lines Flagged", f"{int((summary['Flagged_Days'] > 0).sum()):,} / {len(summary):,}")
+    with col4:
+        st.metric("⏰ Flagged on Last Day", f"{int(summary['Flagged_Last_Day'].sum()):,}")
+    
+    tab1, tab2, tab3 = st.tabs(["🔥 Score Map", "🏢 Per Line", "📋 Flagged Values"])
+    
+    with tab1:
+        fig_scores = figure(
+            'heatmap',
+            scores,
+            x=[day.strftime('%Y-%m-%d') for day in scores.columns],
+            y=list(scores.index),
+            labels={'x': 'Date', 'y': 'Line', 'color': 'Max |z|'},
+            title="Highest |z| per Line and Day",
+            color_continuous_scale='Reds',
+            zmin=0,
+            zmax=max(threshold * 2, 1.0),
+            aspect='auto'
+        )
+        st.plotly_chart(fig_scores, use_container_width=True)
+    
+    with tab2:
+        st.dataframe(summary.round(2), use_container_width=True, hide_index=True)
     
-    # Operational Reports
+    with tab3:
+        if flags.empty:
+            st.success("No anomalies above the threshold")
+        else:
+            st.dataframe(flags.round({'Value': 4, 'Baseline': 4, 'Z': 2}), use_container_width=True, hide_index=True)
+
+@dashboard_section("Operational Reports")
+def operational_reports_section(analytics):
     st.markdown("## 📋 Operational Reports")
     
     col1, col2 = st.columns(2)
@@ -650,112 +715,387 @@ def dashboard_page():
     with col1:
         st.markdown("### 🔍 Top Financial Metrics")
         
-        # Create summary metrics table
-        metrics_data = {
-            'Metric': [
-                'Total Revenue (Deposit)', 
-                'Total Payout (Withdraw)', 
-                'Gross Gaming Revenue (GGR)', 
-                'Net Profit',
-                'Total Bets Placed',
-                'Total Valid Amount',
-                'Bonus Given',
-                'Bonus Deducted',
-                'Net Bonus'
-            ],
-            'Value (RM)': [
-                f"{analytics['total_deposit']:,.2f}",
-                f"{analytics['total_withdraw']:,.2f}",
-                f"{analytics['total_ggr']:,.2f}",
-                f"{analytics['total_net_profit']:,.2f}",
-                f"{analytics['total_bets_amount']:,.2f}",
-                f"{analytics['total_valid_amount']:,.2f}",
-                f"{analytics['total_bonus_given']:,.2f}",
-                f"{analytics['total_bonus_deducted']:,.2f}",
-                f"{analytics['net_bonus']:,.2f}"
-            ],
-            'Cases/Count': [
-                f"{analytics['total_deposit_cases']:,}",
-                f"{analytics['total_withdraw_cases']:,}",
-                "-",
-                "-",
-                f"{analytics['total_bets']:,}",
-                "-",
-                "-",
-                "-",
-                "-"
-            ]
-        }
-        
-        metrics_df = pd.DataFrame(metrics_data)
+        metrics_df = metrics_table(analytics)
         st.dataframe(metrics_df, use_container_width=True)
     
     with col2:
         st.markdown("### 📊 Key Performance Indicators")
         
-        # Calculate additional KPIs
-        deposit_to_withdraw_ratio = analytics['total_deposit'] / analytics['total_withdraw'] if analytics['total_withdraw'] > 0 else 0
-        ggr_margin = (analytics['total_ggr'] / analytics['total_deposit']) * 100 if analytics['total_deposit'] > 0 else 0
-        valid_bet_ratio = (analytics['total_valid_amount'] / analytics['total_bets_amount']) * 100 if analytics['total_bets_amount'] > 0 else 0
-        
-        kpi_data = {
-            'KPI': [
-                'Deposit to Withdraw Ratio',
-                'GGR Margin (%)',
-                'Valid Bet Ratio (%)',
-                'Average Deposit per Case',
-                'Average Withdraw per Case',
-                'Average GGR per Member',
-                'Overall Win Rate (%)',
-                'Active Members'
-            ],
-            'Value': [
-                f"{deposit_to_withdraw_ratio:.2f}",
-                f"{ggr_margin:.2f}%",
-                f"{valid_bet_ratio:.2f}%",
-                f"RM {analytics['avg_deposit_per_case']:,.2f}",
-                f"RM {analytics['avg_withdraw_per_case']:,.2f}",
-                f"RM {analytics['avg_ggr_per_member']:,.2f}",
-                f"{analytics['overall_winrate']:.2%}",
-                f"{analytics['total_active_members']:,}"
-            ]
-        }
-        
-        kpi_df = pd.DataFrame(kpi_data)
+        kpi_df = kpi_table(analytics)
         st.dataframe(kpi_df, use_container_width=True)
 
-    # Data Summary
+# Rows per page of the deposit / withdrawal tables
+TOP_ROWS_PAGE_SIZE = 10
+
+def top_rows_table(store, table, amount_column, start_date, end_date, selected_lines):
+    """Paged most recent / largest rows of ``table`` for the current filter"""
+    total = store.count(table, start_date, end_date, selected_lines)
+    if total == 0:
+        st.info(f"No {table} data available")
+        return
+    
+    order = st.radio(
+        "Order", ["🕒 Most Recent", "💎 Largest"], horizontal=True,
+        key=f"{table}_top_order", label_visibility="collapsed"
+    )
+    pages = (total + TOP_ROWS_PAGE_SIZE - 1) // TOP_ROWS_PAGE_SIZE
+    # Keyed by the filter, so a new filter starts again at page 1
+    page = st.number_input(
+        f"Page (of {pages:,})", min_value=1, max_value=pages, value=1,
+        key=f"{table}_top_page_{start_date}_{end_date}_{selected_lines}"
+    )
+    offset = (page - 1) * TOP_ROWS_PAGE_SIZE
+    
+    # Answered from the per-(Date, Line) row index, only this page's rows are read
+    rows = store.top(
+        table, start_date, end_date, selected_lines, TOP_ROWS_PAGE_SIZE, offset,
+        order='largest' if order == "💎 Largest" else 'recent'
+    )[['User_Name', 'Unique_Code', amount_column, 'Date', 'Line']]
+    rows[amount_column] = rows[amount_column].round(2)
+    st.dataframe(rows, use_container_width=True)
+    st.caption(f"Rows {offset + 1:,}-{offset + len(rows):,} of {total:,}")
+
+@dashboard_section("Member Drilldown")
+def member_drilldown_section(store):
+    st.markdown("## 🔎 Member Drilldown")
+    st.caption(f"Cari User_Name (prefix, tidak case-sensitive, toleran typo) atau Unique_Code dari {len(store.member_index):,} member; seluruh history, semua Line")
+    
+    query = st.text_input("Member", placeholder="User_Name atau Unique_Code", key="member_query")
+    if not query:
+        return
+    matches = store.member_index.search(query)
+    if not matches:
+        st.info("No member matches the search")
+        return
+    name = st.selectbox("Result", matches, key="member_result")
+    rows = store.member_rows(name)
+    daily = member_daily(rows)
+    if daily.empty:
+        st.info("No rows for this member")
+        return
+    
+    member_rows = rows['member']
+    winrate = weighted_winrate(member_rows)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("💰 Deposit", f"RM {daily['Deposit'].sum():,.2f}" if 'Deposit' in daily else "-")
+    with col2:
+        st.metric("💸 Withdraw", f"RM {daily['Withdraw'].sum():,.2f}" if 'Withdraw' in daily else "-")
+    with col3:
+        st.metric("🎯 GGR", f"RM {daily['GGR'].sum():,.2f}" if 'GGR' in daily else "-")
+    with col4:
+        st.metric("🎲 Winrate", f"{winrate:.2%}" if pd.notna(winrate) else "-")
+    with col5:
+        st.metric("📅 Active Days", f"{len(daily):,}")
+    
+    tab1, tab2, tab3 = st.tabs(["📈 Daily", "🎮 Per Line", "📋 Rows"])
+    
+    with tab1:
+        series = [col for col in ('Deposit', 'Withdraw', 'GGR', 'Add_Bonus') if col in daily.columns]
+        fig_member = figure(
+            'line',
+            daily,
+            max_points=POINT_BUDGET,
+            x='Date',
+            y=series,
+            title=f"Daily Activity of {name} (RM)",
+            markers=True
+        )
+        st.plotly_chart(fig_member, use_container_width=True)
+        st.dataframe(daily.round({col: 4 for col in daily.columns if col != 'Date'}), use_container_width=True, hide_index=True)
+    
+    with tab2:
+        if member_rows.empty:
+            st.info("No member report rows")
+        else:
+            per_line = member_rows.groupby('Line', observed=True).agg(
+                Days=('Date', 'nunique'),
+                GGR=('GGR', 'sum'),
+                Deposit_Amount=('Deposit_Amount', 'sum'),
+                Withdraw_Amount=('Withdraw_Amount', 'sum'),
+                Add_Bonus=('Add_Bonus', 'sum'),
+                Cases_Bets=('Cases_Bets', 'sum'),
+            )
+            per_line['Winrate'] = weighted_winrate(member_rows, member_rows['Line'])
+            per_line = per_line.reset_index()
+            st.dataframe(per_line.round(4), use_container_width=True, hide_index=True)
+    
+    with tab3:
+        for table, label in (('deposit', "💰 Deposits"), ('withdraw', "💸 Withdrawals"), ('member', "👤 Member Report")):
+            st.markdown(f"**{label}** ({len(rows[table]):,} rows)")
+            st.dataframe(rows[table].tail(100), use_container_width=True, hide_index=True)
+
+@dashboard_section("Data Summary")
+def data_summary_section(store, start_date, end_date, selected_lines):
     st.markdown("## 📋 Data Summary")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown("### 💰 Recent Deposits")
-        if not deposit_df.empty:
-            recent_deposits = deposit_df.nlargest(10, 'Deposit_Amount')[['User_Name', 'Unique_Code', 'Deposit_Amount', 'Date', 'Line']]
-            recent_deposits['Deposit_Amount'] = recent_deposits['Deposit_Amount'].round(2)
-            st.dataframe(recent_deposits, use_container_width=True)
-        else:
-            st.info("No deposit data available")
+        st.markdown("### 💰 Deposits")
+        top_rows_table(store, 'deposit', 'Deposit_Amount', start_date, end_date, selected_lines)
     
     with col2:
-        st.markdown("### 💸 Recent Withdrawals")
-        if not withdraw_df.empty:
-            recent_withdrawals = withdraw_df.nlargest(10, 'Withdraw_Amount')[['User_Name', 'Unique_Code', 'Withdraw_Amount', 'Date', 'Line']]
-            recent_withdrawals['Withdraw_Amount'] = recent_withdrawals['Withdraw_Amount'].round(2)
-            st.dataframe(recent_withdrawals, use_container_width=True)
+        st.markdown("### 💸 Withdrawals")
+        top_rows_table(store, 'withdraw', 'Withdraw_Amount', start_date, end_date, selected_lines)
+    
+    st.markdown("### 🧠 Memory Footprint")
+    st.dataframe(store.footprint, use_container_width=True)
+
+# Exports: written in chunks to files that all sessions share
+@st.cache_resource
+def get_export_cache():
+    """Process-wide cache of export files"""
+    return ExportCache()
+
+EXPORT_TABLES = {
+    'deposit': "💰 Deposit rows",
+    'withdraw': "💸 Withdraw rows",
+    'member': "👥 Member rows",
+    'line_performance': "📈 Line Performance",
+    'metrics': "🔍 Financial Metrics",
+    'kpi': "📊 KPIs",
+}
+
+@st.fragment
+def export_panel(store, start_date, end_date, selected_lines):
+    st.markdown("### 📥 Export Data")
+    table = st.selectbox("Table", list(EXPORT_TABLES), format_func=EXPORT_TABLES.get, key="export_table")
+    fmt = st.selectbox("Format", list(FORMATS), format_func=str.upper, key="export_format")
+    
+    too_big = fmt == 'xlsx' and table in ROW_TABLES and store.count(table, start_date, end_date, selected_lines) >= XLSX_MAX_ROWS
+    if too_big:
+        st.warning("⚠️ Too many rows for one XLSX sheet, use CSV or Parquet")
+    
+    # The file is only built when the button is clicked, and only once per filter
+    exports, result_cache = get_export_cache(), get_result_cache()
+    def open_export():
+        return open(exports.export(store, result_cache, table, fmt, start_date, end_date, selected_lines), 'rb')
+    
+    st.download_button(
+        "📥 Download",
+        data=open_export,
+        file_name=export_file_name(table, fmt, start_date, end_date, selected_lines, store.key),
+        mime=FORMATS[fmt],
+        disabled=too_big,
+        on_click="ignore"
+    )
+
+# Theme selector in its own fragment, switching it does not rerun the page
+@st.fragment
+def theme_selector():
+    theme = st.selectbox("🎨 Theme", ["Dark", "Light"])
+    if theme == "Light":
+        st.info("🌞 Light theme selected")
+
+# Dashboard page
+def dashboard_page():
+    load_css()
+    
+    # Data version as last seen by the source watcher; only stats the sources unless they
+    # changed (the first poll ingests, with a progress bar)
+    ingest_status = st.empty()
+    with PROFILER.stage('source_watcher'):
+        watcher = get_source_watcher()
+        watcher.poll(ingest_progress(ingest_status))
+    ingest_status.empty()
+    st.session_state.data_version = watcher.version
+    
+    # Sidebar
+    with st.sidebar:
+        st.markdown(f"### 👋 Welcome, {st.session_state.username}!")
+        st.markdown(f"**Login:** {st.session_state.login_time.strftime('%d/%m/%Y %H:%M')}")
+        
+        if st.button("🔄 Refresh"):
+            watcher.poll(ingest_progress(st.empty()))
+            st.rerun()
+        
+        # Auto-refresh toggle (reruns only when the watcher saw new data)
+        auto_refresh = st.checkbox("🔄 Auto Refresh (30s)")
+        if auto_refresh:
+            auto_refresh_check()
+        if watcher.last_error:
+            st.warning(f"⚠️ Data refresh failed: {watcher.last_error}")
+        
+        # Theme selector
+        theme_selector()
+        
+        if st.button("🚪 Logout"):
+            for key in ['logged_in', 'username', 'login_time']:
+                if key in st.session_state:
+                    del st.session_state[key]
+            st.rerun()
+    
+    # Header
+    st.markdown('<h1 style="text-align: center; color: white;">🎮 Gaming Platform Dashboard</h1>', unsafe_allow_html=True)
+    
+    # Load real data first to get available lines (shared store, not copied per session)
+    with PROFILER.stage('load_data_store'):
+        try:
+            store = load_data_store(DATA_DIR, st.session_state.data_version)
+        except Exception as e:
+            store = None
+            load_error = watcher.last_error or str(e)
+    if store is None:
+        # Nothing usable was ingested yet; Refresh or auto refresh pick up the fixed sources
+        st.error(f"Error loading data: {load_error}")
+        st.stop()
+    deposit_df, withdraw_df, member_df = store.frames
+    
+    # Date range and Lines offered by the filters
+    with PROFILER.stage('filters'):
+        if not member_df.empty:
+            min_date = member_df['Date'].min().date()
+            max_date = member_df['Date'].max().date()
+        
+            # Set default to show last 30 days of data or full range if less than 30 days
+            if (max_date - min_date).days <= 30:
+                default_start_date = min_date
+                default_end_date = max_date
+            else:
+                default_start_date = max_date - timedelta(days=30)
+                default_end_date = max_date
         else:
-            st.info("No withdrawal data available")
+            min_date = datetime.now().date() - timedelta(days=30)
+            max_date = datetime.now().date()
+            default_start_date = min_date
+            default_end_date = max_date
+    
+        # Get available lines from data
+        available_lines = ["All"]
+        if not member_df.empty:
+            unique_lines = sorted(member_df['Line'].unique())
+            available_lines.extend(unique_lines)
+    
+    # Filters
+    st.markdown("## 🔍 Filters")
+    
+    # Show data date range info
+    if not member_df.empty:
+        st.info(f"📅 **Data Available**: {min_date.strftime('%d %B %Y')} to {max_date.strftime('%d %B %Y')} ({(max_date - min_date).days + 1} days)")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        start_date = st.date_input(
+            "📅 Start Date", 
+            value=default_start_date,
+            min_value=min_date,
+            max_value=max_date
+        )
+        end_date = st.date_input(
+            "📅 End Date", 
+            value=default_end_date,
+            min_value=min_date,
+            max_value=max_date
+        )
+    
+    with col2:
+        selected_line = st.selectbox("🎮 Line:", available_lines)
+        compare_mode = st.selectbox(
+            "📊 Compare with:",
+            # Only modes whose range does not overlap the selected one
+            ["none", *comparison_modes(start_date, end_date), "custom"],
+            index=1,
+            format_func=lambda mode: {"none": "No comparison", "custom": "Custom range", **COMPARISON_MODES}[mode].capitalize()
+        )
+        compare_range = None
+        if compare_mode == "custom":
+            # Two-range mode: the selected range against any other range
+            custom_range = st.date_input(
+                "📅 Comparison Range",
+                value=comparison_range(start_date, end_date, 'previous'),
+                max_value=max_date
+            )
+            if len(custom_range) == 2:
+                compare_range = tuple(custom_range)
+        elif compare_mode != "none":
+            compare_range = comparison_range(start_date, end_date, compare_mode)
+        if st.button("🔄 Apply Filters"):
+            st.rerun()
+    
+    # Calculate comprehensive analytics (totals and distinct members come from the daily cube,
+    # results are memoized per filter + data version across sessions)
+    selected_lines = None if selected_line == "All" else (selected_line,)
+    cube = store.cube
+    result_cache = get_result_cache()
+    with PROFILER.stage('analytics'):
+        analytics = queries.analytics(store, result_cache, start_date, end_date, selected_lines)
+        # Both periods come from one lookup in the cube
+        comparison = None
+        if compare_range is not None:
+            _, previous = queries.comparison(store, result_cache, [(start_date, end_date), compare_range], selected_lines)
+            label = f"{compare_range[0].strftime('%d %b')} - {compare_range[1].strftime('%d %b %Y')}"
+            if compare_range[0] < min_date:
+                label += " (partial)"
+            comparison = {'metrics': previous, 'label': label}
+    cache_stats = result_cache.stats()
+    st.sidebar.caption(
+        f"📦 Analytics cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['size']}/{cache_stats['maxsize']} entries)"
+    )
+    member_records = cube.totals('member', start_date, end_date, selected_lines)['Records']
+    
+    with st.sidebar:
+        export_panel(store, start_date, end_date, selected_lines)
+        if PROFILER.enabled and st.session_state.username == 'admin':
+            profiling_panel()
+    
+    # Display line selection info
+    if member_records > 0:
+        currency_information_section(store, start_date, end_date, selected_lines)
+        line_information_section(store, start_date, end_date, selected_lines)
+    
+    key_metrics_section(analytics, comparison)
+    weekly_analytics_section(store, start_date, end_date, selected_lines)
+    financial_analytics_section(analytics, comparison)
+    line_performance_section(analytics)
+    cohort_section(store, selected_lines)
+    anomaly_section(store, start_date, end_date, selected_lines)
+    operational_reports_section(analytics)
+    member_drilldown_section(store)
+    data_summary_section(store, start_date, end_date, selected_lines)
+
+# Profiling (DASHBOARD_PROFILE=1): stage timings per run, shown to admins
+PROFILER.watch_cache('figures', FIGURE_CACHE.stats)
+
+def profiling_panel():
+    """Stage timings of this session's last runs and of all recent runs"""
+    with st.expander("⏱️ Profiling"):
+        runs = [run for run in PROFILER.recent(st.session_state.get('session_id')) if run['run'] == 'rerun']
+        if not runs:
+            st.caption("No finished rerun yet")
+            return
+        last = runs[-1]
+        st.markdown(f"**Last rerun:** {last['ms']:,.0f} ms")
+        st.dataframe(pd.DataFrame(last['stages']), hide_index=True, use_container_width=True)
+        st.dataframe(
+            pd.DataFrame([{'Cache': name, **counts} for name, counts in last['cache'].items()]),
+            hide_index=True, use_container_width=True,
+        )
+        # Mean per stage over the recent runs of all sessions
+        stages = pd.DataFrame([stage for run in PROFILER.recent() for stage in run['stages']])
+        if not stages.empty:
+            st.markdown("**Recent runs (all sessions)**")
+            summary = stages.groupby('stage').agg(runs=('ms', 'size'), mean_ms=('ms', 'mean'), max_ms=('ms', 'max'))
+            st.dataframe(summary.round(1).sort_values('mean_ms', ascending=False), use_container_width=True)
+        st.caption(f"Written to {PROFILER.path} ({PROFILER.format})")
 
 # Main function
 def main():
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:8]
     
-    if st.session_state.logged_in:
-        dashboard_page()
-    else:
-        login_page()
+    with PROFILER.rerun('rerun', st.session_state.session_id):
+        if API_PORT:
+            start_query_api()
+        
+        if st.session_state.logged_in:
+            dashboard_page()
+        else:
+            login_page()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
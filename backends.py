@@ -0,0 +1,132 @@
+"""Execution backends for the row-level aggregations of the analytics.
+
+``calculate_comprehensive_analytics`` (line performance) and
+``generate_time_series_analytics`` (daily sums, distinct members per day)
+aggregate the filtered rows. Those aggregations go through a backend:
+
+    pandas   the reference implementation, single-threaded groupbys
+    duckdb   the same aggregations as SQL on DuckDB's multi-threaded,
+             vectorized engine, scanning the frames in place (no copy)
+
+Choose one with ``DASHBOARD_BACKEND`` (default ``pandas``). DuckDB is an
+optional dependency (``pip install duckdb``). Both backends sum in float64
+and return the same shapes; ``tests/test_backend_parity.py`` checks that
+their results agree.
+
+Only these row-level functions use a backend. The page and the query API
+answer from the DailyCube (``queries``, ``calculate_cube_*``), which is
+built once per data version with numpy and has no row scans left to
+offload, so the backend matters for batch callers of the row-level
+functions and for ``benchmark.py --backend``, not for the served numbers.
+"""
+import os
+import threading
+
+import pandas as pd
+
+from distinct import encode_members
+
+BACKEND = os.environ.get('DASHBOARD_BACKEND', 'pandas')
+
+# Columns of the line performance table, summed per Line
+LINE_PERFORMANCE_SUMS = ['GGR', 'Net_Profit', 'Deposit_Amount', 'Withdraw_Amount']
+
+
+class PandasBackend:
+    """Reference backend: pandas groupbys"""
+
+    name = 'pandas'
+
+    def line_performance(self, member_df):
+        """Per-Line float64 sums and distinct members of the member rows"""
+        member_df = member_df.astype({col: 'float64' for col in LINE_PERFORMANCE_SUMS})
+        return member_df.groupby('Line', observed=True).agg({
+            **{col: 'sum' for col in LINE_PERFORMANCE_SUMS},
+            'User_Name': 'nunique',
+        }).reset_index()
+
+    def daily_sums(self, df, columns):
+        """float64 sums of ``columns`` ({column: output name}) per day, indexed by the sorted day"""
+        day = df['Date'].dt.normalize().rename('Date')
+        # Summed in float64 like the cube, not in the float32 storage dtype
+        values = df[list(columns)].astype('float64')
+        return values.groupby(day, sort=True).sum().rename(columns=columns)
+
+    def member_days(self, member_df):
+        """(day, member id) of the member rows, member ids from ``encode_members``"""
+        member_ids, _ = encode_members(member_df['User_Name'])
+        valid = member_ids >= 0
+        return member_df['Date'].dt.normalize().to_numpy()[valid], member_ids[valid]
+
+
+class DuckDBBackend:
+    """Backend running the aggregations as SQL on an embedded DuckDB"""
+
+    name = 'duckdb'
+
+    def __init__(self, threads=None):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("DASHBOARD_BACKEND=duckdb needs the duckdb package (pip install duckdb)") from None
+        self._connection = duckdb.connect()
+        if threads:
+            self._connection.execute(f"SET threads = {int(threads)}")
+        self._lock = threading.Lock()
+
+    def _query(self, sql, **frames):
+        # A cursor per query: connections must not be shared between threads
+        with self._lock:
+            cursor = self._connection.cursor()
+        try:
+            for name, df in frames.items():
+                cursor.register(name, df)
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def line_performance(self, member_df):
+        sums = ', '.join(f'SUM(CAST("{col}" AS DOUBLE)) AS "{col}"' for col in LINE_PERFORMANCE_SUMS)
+        result = self._query(
+            f'SELECT "Line", {sums}, COUNT(DISTINCT "User_Name") AS "User_Name" '
+            'FROM rows WHERE "Line" IS NOT NULL GROUP BY "Line" ORDER BY "Line"',
+            rows=member_df,
+        )
+        # Same dtypes as the pandas groupby
+        result['Line'] = pd.Categorical(result['Line'], categories=member_df['Line'].cat.categories)
+        return result.astype({'User_Name': 'int64'})
+
+    def daily_sums(self, df, columns):
+        sums = ', '.join(f'SUM(CAST("{col}" AS DOUBLE)) AS "{name}"' for col, name in columns.items())
+        result = self._query(
+            f'SELECT CAST("Date" AS DATE) AS day, {sums} FROM rows '
+            'WHERE "Date" IS NOT NULL GROUP BY day ORDER BY day',
+            rows=df,
+        )
+        index = pd.DatetimeIndex(result.pop('day').astype('datetime64[ns]'), name='Date')
+        return result.set_index(index)
+
+    def member_days(self, member_df):
+        result = self._query(
+            'SELECT DISTINCT CAST("Date" AS DATE) AS day, "User_Name" FROM rows '
+            'WHERE "Date" IS NOT NULL AND "User_Name" IS NOT NULL',
+            rows=member_df,
+        )
+        member_ids, _ = encode_members(result['User_Name'])
+        return result['day'].to_numpy(dtype='datetime64[ns]'), member_ids
+
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend}
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """The shared backend instance for ``name`` (default: DASHBOARD_BACKEND)"""
+    name = name or BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name} (use {', '.join(BACKENDS)})")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
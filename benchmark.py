@@ -0,0 +1,228 @@
+"""Benchmark of the dashboard pipeline on synthetic exports.
+
+For each size (members x days) the harness generates data with
+``synthetic``, then times every stage of the pipeline the page runs:
+
+    generate            synthetic frames in memory
+    write_xlsx          export workbooks on disk      (up to --excel-max-rows member rows)
+    load_cold           load_frames on an empty cache: parse + merge + snapshots
+    load_warm           load_frames from the snapshots (what load_real_data does)
+    normalize           currency conversion + schema on the generated frames
+                        (sizes too large for the Excel stages)
+    build_store         DataStore: cube, distinct members, top-N indexes
+    filter[...]         the date/Line filter of the page, per filter scenario
+    scan[...]           the same rows read from the partitioned store     (Excel sizes only)
+    analytics[...]      calculate_comprehensive_analytics on the filtered rows  (--backend)
+    time_series[...]    generate_time_series_analytics on the filtered rows     (--backend)
+    cube_analytics[...] / cube_time_series[...]   the same answers from the cube
+
+Each stage runs ``--repeat`` times (best time reported) and once more under
+tracemalloc for its peak traced memory (numpy and pandas allocations
+included, arrow buffers and worker processes not); the process' max RSS
+after the stage is recorded as well. The report is JSON::
+
+    python benchmark.py --sizes 1000x30,10000x30,100000x60
+    python benchmark.py --sizes 2000000x60 --no-excel --output bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analytics import (
+    calculate_comprehensive_analytics, calculate_cube_analytics, calculate_cube_time_series,
+    generate_time_series_analytics,
+)
+from backends import BACKENDS, get_backend
+from currency import load_rate_table, normalize_currency
+from ingest import CACHE_DIR, TABLES
+from schema import apply_schema
+from store import DataStore, load_frames, scan_frame
+from synthetic import LINES, generate_exports, generate_rates, write_exports
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_DIR = os.path.join(CACHE_DIR, 'benchmarks')
+DEFAULT_SIZES = '1000x30,10000x30,50000x60'
+
+# Largest member report the Excel stages run for by default; writing and parsing XLSX is slow
+EXCEL_MAX_ROWS = 250_000
+
+
+def parse_sizes(text):
+    """'1000x30,10000x60' -> [(1000, 30), (10000, 60)]"""
+    sizes = []
+    for part in text.split(','):
+        members, _, days = part.strip().lower().partition('x')
+        sizes.append((int(members), int(days or 30)))
+    return sizes
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def measure(fn, repeat=1, trace_memory=True):
+    """(result of the last run, timing record) for calling ``fn`` ``repeat`` times"""
+    runs = []
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, {
+        'seconds': round(min(runs), 6),
+        'runs': [round(run, 6) for run in runs],
+        'peak_mb': round(peak / 2**20, 2) if peak is not None else None,
+        'max_rss_mb': _max_rss_mb(),
+    }
+
+
+def filter_scenarios(dates):
+    """The page's filters to time: everything, one Line, the last week"""
+    start, end = dates.min().date(), dates.max().date()
+    return {
+        'all': (start, end, None),
+        'line': (start, end, (LINES[0],)),
+        'week': (max(start, end - pd.Timedelta(days=6).to_pytimedelta()), end, None),
+    }
+
+
+def run_size(members, days, work_dir, repeat=1, excel_max_rows=EXCEL_MAX_ROWS, trace_memory=True, seed=0,
+             backend=None):
+    """Stage timings for one size"""
+    stages = {}
+
+    def stage(name, fn):
+        result, stages[name] = measure(fn, repeat, trace_memory)
+        peak = stages[name]['peak_mb']
+        print(f"  {name:<28} {stages[name]['seconds']:>10.3f}s" + (f"  peak {peak:,.1f} MB" if peak is not None else ''), flush=True)
+        return result
+
+    generated = stage('generate', lambda: generate_exports(members, days, seed=seed))
+    rates = generate_rates(days, seed=seed)
+    rows = {table: len(df) for table, df in generated.items()}
+
+    cache_dir = None
+    if rows['member'] <= excel_max_rows:
+        data_dir = os.path.join(work_dir, 'exports')
+        cache_dir = os.path.join(work_dir, 'cache')
+        stage('write_xlsx', lambda: write_exports(generated, data_dir, rates))
+        rate_table = load_rate_table(os.path.join(data_dir, 'fx_rates.csv'))
+
+        def load_cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return load_frames(data_dir, rate_table, cache_dir)
+
+        stage('load_cold', load_cold)
+        frames = stage('load_warm', lambda: load_frames(data_dir, rate_table, cache_dir))
+    else:
+        frames = stage('normalize', lambda: tuple(
+            apply_schema(normalize_currency(generated[table].copy(), rates), table) for table in TABLES
+        ))
+    del generated
+    gc.collect()
+
+    store = stage('build_store', lambda: DataStore(*frames))
+    for name, (start, end, lines) in filter_scenarios(frames[2]['Date']).items():
+        filtered = stage(f'filter[{name}]', lambda: tuple(
+            store.filter(table, start, end, lines) for table in TABLES
+        ))
+        if cache_dir is not None:
+            stage(f'scan[{name}]', lambda: tuple(
+                scan_frame(table, start, end, lines, rates=rate_table, cache_dir=cache_dir) for table in TABLES
+            ))
+        stage(f'analytics[{name}]', lambda: calculate_comprehensive_analytics(*filtered, backend=backend))
+        stage(f'time_series[{name}]', lambda: generate_time_series_analytics(*filtered, backend=backend))
+        stage(f'cube_analytics[{name}]', lambda: calculate_cube_analytics(store.cube, start, end, lines))
+        stage(f'cube_time_series[{name}]', lambda: calculate_cube_time_series(store.cube, start, end, lines))
+
+    return {'members': members, 'days': days, 'backend': get_backend(backend).name, 'rows': rows, 'stages': stages}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+        'git_commit': _git_commit(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the dashboard pipeline on synthetic data")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma-separated MEMBERSxDAYS (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=1, help="timed runs per stage, best is reported")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=list(BACKENDS), help="execution backend (default: DASHBOARD_BACKEND)")
+    parser.add_argument('--excel-max-rows', type=int, default=EXCEL_MAX_ROWS,
+                        help="run the workbook stages up to this many member rows (default: %(default)s)")
+    parser.add_argument('--no-excel', action='store_true', help="skip writing and ingesting workbooks")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run of each stage")
+    parser.add_argument('--output', help="report path (default: .data_cache/benchmarks/benchmark-<time>.json)")
+    args = parser.parse_args(argv)
+
+    started = datetime.now()
+    report = {'created': started.isoformat(timespec='seconds'), 'environment': environment(), 'results': []}
+    for members, days in parse_sizes(args.sizes):
+        print(f"{members:,} members x {days} days", flush=True)
+        work_dir = tempfile.mkdtemp(prefix='dashboard-bench-')
+        try:
+            report['results'].append(run_size(
+                members, days, work_dir, args.repeat, -1 if args.no_excel else args.excel_max_rows,
+                not args.no_memory, args.seed, args.backend
+            ))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(REPORT_DIR, f"benchmark-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Cached, size-bounded Plotly figures for the dashboard.
+
+Figures are built once per input aggregate and chart options and kept in a
+process-wide cache keyed by a content hash of the aggregate, so reruns and
+other sessions showing the same data reuse the built figure instead of
+going through plotly express again. Streamlit serializes a figure itself
+when it is sent, so the cache holds built Figures rather than JSON specs
+(re-validating a spec costs about as much as building it). Cached figures
+are shared and must not be modified by callers.
+
+To keep payloads small, long series are downsampled to a point budget with
+largest-triangle-three-buckets (LTTB), which keeps the visual shape of a
+line. Plotted values keep their dtype: money totals in float32 would show
+rounded hover values (12,345,678.91 as 12,345,679).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from result_cache import ResultCache
+
+# Points per line trace, about one per pixel of a wide-layout chart column
+POINT_BUDGET = 800
+
+_BUILDERS = {
+    'bar': px.bar,
+    'line': px.line,
+    'scatter': px.scatter,
+    'pie': px.pie,
+    'heatmap': px.imshow,
+}
+
+FIGURE_CACHE = ResultCache(maxsize=128)
+
+
+def frame_key(df):
+    """Content hash of a (small, aggregated) frame"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(col, str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def lttb_indices(x, y, n_out):
+    """Positions of the points LTTB keeps when reducing (x, y) to n_out points"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    # First and last points are always kept, the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(df, x, y, max_points=POINT_BUDGET):
+    """Rows of ``df`` (sorted by ``x``) reduced to about max_points per ``y`` column"""
+    if len(df) <= max_points:
+        return df
+    columns = [y] if isinstance(y, str) else list(y)
+    x_values = df[x].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype('datetime64[ns]').astype(np.int64)
+    # Union of the points kept for each series, so every line keeps its shape
+    keep = np.unique(np.concatenate([
+        lttb_indices(x_values, df[col].to_numpy(), max(max_points // len(columns), 3)) for col in columns
+    ]))
+    return df.iloc[keep]
+
+
+def _build(kind, df, max_points, layout, kwargs):
+    if max_points and 'x' in kwargs and 'y' in kwargs:
+        df = downsample(df, kwargs['x'], kwargs['y'], max_points)
+    fig = _BUILDERS[kind](df, **kwargs)
+    if layout:
+        fig.update_layout(**layout.get('layout', {}))
+        if 'xaxes' in layout:
+            fig.update_xaxes(**layout['xaxes'])
+    return fig
+
+
+def figure(kind, df, max_points=None, layout=None, **kwargs):
+    """Cached plotly express ``kind`` figure of ``df``.
+
+    ``kwargs`` go to the plotly express function, ``max_points`` enables
+    downsampling of long series and ``layout`` may hold 'layout' and
+    'xaxes' updates applied to the built figure.
+    """
+    key = (kind, frame_key(df), max_points, repr(layout), repr(sorted(kwargs.items())))
+    return FIGURE_CACHE.get_or_compute(key, lambda: _build(kind, df, max_points, layout, kwargs))
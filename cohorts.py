@@ -0,0 +1,246 @@
+"""Member cohorts and weekly retention from the member report.
+
+A member's cohort is the (Monday-based) week of their first row. Per Line
+selection a ``CohortEngine`` keeps, over integer member ids:
+
+    first_week / last_week     per member
+    active[cohort, week]       distinct active members of a cohort per week
+    ggr[cohort, week]          GGR of a cohort's members per week
+    new / retained / reactivated / churn events per week
+
+Rows are reduced to distinct (member, week) pairs with one sort, and every
+pair is classified by the gap to the member's previous active week: none
+(new), 1 (retained) or more (reactivated, with a churn one week after the
+previous activity). All of it is vectorized; there is no per-member loop.
+
+Updates are incremental: the engine remembers the last day it processed
+and only feeds the rows after it, which extend the matrices. Member ids
+stay stable across reloads because they are assigned by name. If the
+processed part of the history changed (a re-export rewrote old days, new
+exchange rates), the engine starts over.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from queries import normalize_lines
+
+# Week numbers count Mondays from 1970-01-05
+_EPOCH_MONDAY = np.datetime64('1970-01-05', 'D')
+
+
+def week_numbers(dates):
+    """Monday-based week number of each date"""
+    days = np.asarray(dates).astype('datetime64[D]')
+    return (days - _EPOCH_MONDAY).astype(np.int64) // 7
+
+
+def week_starts(weeks):
+    """Monday of each week number"""
+    return pd.DatetimeIndex((_EPOCH_MONDAY + np.asarray(weeks, dtype=np.int64) * 7).astype('datetime64[ns]'))
+
+
+def _grow(array, shape):
+    """``array`` zero-padded at the end of each axis to at least ``shape``"""
+    pad = [(0, max(0, size - current)) for size, current in zip(shape, array.shape)]
+    return np.pad(array, pad) if any(after for _, after in pad) else array
+
+
+class CohortEngine:
+    """Incrementally maintained cohort matrices for one Line selection"""
+
+    def __init__(self, lines=None):
+        self.lines = normalize_lines(lines)
+        self.version = None
+        self.tables = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.names = pd.Index([], dtype=object)
+        self.first_week = np.empty(0, dtype=np.int64)
+        self.last_week = np.empty(0, dtype=np.int64)
+        self.week0 = None
+        self.active = np.zeros((0, 0), dtype=np.int64)
+        self.ggr = np.zeros((0, 0), dtype=np.float64)
+        self.new = np.zeros(0, dtype=np.int64)
+        self.retained = np.zeros(0, dtype=np.int64)
+        self.reactivated = np.zeros(0, dtype=np.int64)
+        self.churn_events = np.zeros(0, dtype=np.int64)
+        # Processed prefix: last day, rows and GGR total
+        self.last_date = None
+        self.rows = 0
+        self.ggr_total = 0.0
+
+    @property
+    def n_weeks(self):
+        return len(self.new)
+
+    def update(self, member_df):
+        """Feed the rows after the last processed day (all rows after a change of history)"""
+        df = member_df
+        if self.lines is not None and not df.empty:
+            df = df[df['Line'].isin(self.lines)]
+        if not df.empty and not df['Date'].is_monotonic_increasing:
+            df = df.sort_values('Date', kind='stable')
+
+        if self.last_date is not None:
+            split = int(np.searchsorted(df['Date'].to_numpy(), self.last_date + np.timedelta64(1, 'D'), 'left'))
+            processed = df.iloc[:split]
+            if len(processed) == self.rows and np.isclose(_ggr(processed).sum(), self.ggr_total, rtol=1e-9, atol=1e-6):
+                df = df.iloc[split:]
+            else:
+                self.reset()
+        if not df.empty:
+            self._extend(df)
+            self.last_date = df['Date'].to_numpy()[-1].astype('datetime64[D]')
+            self.rows += len(df)
+            self.ggr_total += float(_ggr(df).sum())
+        return self
+
+    def _member_ids(self, names):
+        """Stable integer ids of the member names (-1 for missing), new names appended"""
+        if not isinstance(names.dtype, pd.CategoricalDtype):
+            names = names.astype('category')
+        categories = names.cat.categories
+        ids = self.names.get_indexer(categories)
+        unknown = ids < 0
+        if unknown.any():
+            ids[unknown] = np.arange(len(self.names), len(self.names) + int(unknown.sum()))
+            self.names = self.names.append(pd.Index(categories[unknown], dtype=object))
+        codes = names.cat.codes.to_numpy()
+        return np.where(codes >= 0, ids[codes], -1)
+
+    def _extend(self, df):
+        ids = self._member_ids(df['User_Name'])
+        valid = ids >= 0
+        ids, weeks, ggr = ids[valid], week_numbers(df['Date'].to_numpy()[valid]), _ggr(df)[valid]
+        if not len(ids):
+            return
+        if self.week0 is None:
+            self.week0 = int(weeks.min())
+        weeks = weeks - self.week0
+        n_members, n_weeks = len(self.names), max(self.n_weeks, int(weeks.max()) + 1)
+        self.first_week = np.concatenate([self.first_week, np.full(n_members - len(self.first_week), -1)])
+        self.last_week = np.concatenate([self.last_week, np.full(n_members - len(self.last_week), -1)])
+
+        # Distinct (member, week) pairs, sorted by member then week
+        keys = np.unique(ids * n_weeks + weeks)
+        members, pair_weeks = keys // n_weeks, keys % n_weeks
+        # The week that was last processed may continue in the new rows
+        counted = self.last_week[members] == pair_weeks
+        members, pair_weeks = members[~counted], pair_weeks[~counted]
+
+        first_of_member = np.concatenate([[True], members[1:] != members[:-1]])
+        last_of_member = np.concatenate([members[1:] != members[:-1], [True]])
+        previous = np.where(first_of_member, self.last_week[members], np.concatenate([[-1], pair_weeks[:-1]]))
+        is_new = previous < 0
+        gap = pair_weeks - previous
+
+        self.first_week[members[is_new]] = pair_weeks[is_new]
+        self.last_week[members[last_of_member]] = pair_weeks[last_of_member]
+        cohorts = self.first_week[members]
+
+        self.active = _grow(self.active, (n_weeks, n_weeks))
+        self.ggr = _grow(self.ggr, (n_weeks, n_weeks))
+        for name in ('new', 'retained', 'reactivated', 'churn_events'):
+            setattr(self, name, _grow(getattr(self, name), (n_weeks,)))
+
+        self.active += np.bincount(cohorts * n_weeks + pair_weeks, minlength=n_weeks * n_weeks).reshape(n_weeks, n_weeks)
+        self.new += np.bincount(pair_weeks[is_new], minlength=n_weeks)
+        self.retained += np.bincount(pair_weeks[~is_new & (gap == 1)], minlength=n_weeks)
+        returning = ~is_new & (gap > 1)
+        self.reactivated += np.bincount(pair_weeks[returning], minlength=n_weeks)
+        # Active the week after the previous activity no more: churned then
+        self.churn_events += np.bincount(previous[returning] + 1, minlength=n_weeks)
+
+        row_cohorts = self.first_week[ids]
+        self.ggr += np.bincount(row_cohorts * n_weeks + weeks, weights=ggr, minlength=n_weeks * n_weeks).reshape(n_weeks, n_weeks)
+
+    def _cohort_index(self):
+        return week_starts(self.week0 + np.arange(self.n_weeks)) if self.n_weeks else pd.DatetimeIndex([])
+
+    def cohort_sizes(self):
+        return np.bincount(self.first_week[self.first_week >= 0], minlength=self.n_weeks)
+
+    def retention(self, share=True):
+        """Cohort x weeks-since-first-seen matrix of active members (as a share of the cohort)"""
+        n = self.n_weeks
+        if not n:
+            return pd.DataFrame()
+        age = np.arange(n)
+        week = age[None, :] + age[:, None]
+        inside = week < n
+        matrix = np.where(inside, self.active[age[:, None], np.minimum(week, n - 1)], 0).astype('float64')
+        sizes = self.cohort_sizes()
+        if share:
+            matrix = np.divide(matrix, sizes[:, None], out=np.zeros_like(matrix), where=sizes[:, None] > 0)
+        matrix[~inside] = np.nan
+        keep = sizes > 0
+        table = pd.DataFrame(matrix[keep], index=self._cohort_index()[keep], columns=[f"W{i}" for i in age])
+        table.index.name = 'Cohort'
+        return table
+
+    def weekly_activity(self):
+        """Active, new, retained, reactivated and churned members per week"""
+        n = self.n_weeks
+        if not n:
+            return pd.DataFrame()
+        # Members whose last activity lies before the last week churned the week after it
+        open_churn = self.last_week[(self.last_week >= 0) & (self.last_week < n - 1)] + 1
+        churned = self.churn_events + np.bincount(open_churn, minlength=n)
+        return pd.DataFrame({
+            'Week_Start': self._cohort_index(),
+            'Active': self.new + self.retained + self.reactivated,
+            'New': self.new,
+            'Retained': self.retained,
+            'Reactivated': self.reactivated,
+            'Churned': churned,
+        })
+
+    def lifetime_ggr(self):
+        """Members, lifetime GGR and GGR per member of every cohort"""
+        n = self.n_weeks
+        if not n:
+            return pd.DataFrame()
+        sizes = self.cohort_sizes()
+        totals = self.ggr.sum(axis=1)
+        table = pd.DataFrame({
+            'Cohort': self._cohort_index(),
+            'Members': sizes,
+            'Lifetime_GGR': totals,
+            'GGR_per_Member': np.divide(totals, sizes, out=np.zeros(n), where=sizes > 0),
+        })
+        return table[sizes > 0].reset_index(drop=True)
+
+
+def _ggr(df):
+    return df['GGR'].to_numpy(dtype='float64', na_value=0.0) if 'GGR' in df.columns else np.zeros(len(df))
+
+
+class CohortCache:
+    """One CohortEngine per Line selection, brought up to date with each new data version"""
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def get(self, store, lines=None):
+        """Retention, weekly activity and lifetime GGR tables of ``lines`` for the store's data"""
+        lines = normalize_lines(lines)
+        with self._lock:
+            engine = self._engines.get(lines)
+            if engine is None:
+                engine = self._engines[lines] = CohortEngine(lines)
+        # Tables are built under the engine's lock, so a concurrent update never shows half-way
+        with engine.lock:
+            if engine.version != store.version:
+                engine.update(store.tables['member'])
+                engine.version = store.version
+                engine.tables = {
+                    'retention': engine.retention(),
+                    'weekly_activity': engine.weekly_activity(),
+                    'lifetime_ggr': engine.lifetime_ggr(),
+                }
+            return engine.tables
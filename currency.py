@@ -0,0 +1,95 @@
+"""Currency normalization for the loaded frames.
+
+Every amount column is converted to the base currency (MYR) in a single
+block multiplication by a per-row rate. Rates come from a local CSV rate
+table with ``Date,Currency,Rate`` columns, where ``Rate`` is the amount of
+MYR for one unit of the currency on that date. A row uses the latest rate
+dated on or before its own Date (the earliest one for rows older than the
+table). Currencies missing from the table fall back to DEFAULT_RATES.
+
+The original currency and the rate applied are kept per row in
+``Original_Currency`` and ``FX_Rate``, so original amounts are
+``amount / FX_Rate``.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_CURRENCY = 'MYR'
+RATES_FILE = os.environ.get('DASHBOARD_RATES_FILE', 'fx_rates.csv')
+
+# Used for currencies that have no entry in the rate table
+DEFAULT_RATES = {'MYR': 1.0, 'SGD': 3.4}
+
+# Columns holding money amounts
+AMOUNT_COLUMNS = [
+    'Deposit_Amount', 'Withdraw_Amount', 'Bonus', 'Add_Bonus', 'Deduct_Bonus',
+    'Add_Transaction', 'Deduct_Transaction', 'Bets_Amount', 'Valid_Amount',
+    'GGR', 'Net_Profit'
+]
+
+
+def load_rate_table(path=RATES_FILE):
+    """Read the daily rate table, or an empty one if there is no rate file"""
+    if not os.path.exists(path):
+        return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Currency': pd.Series(dtype=str), 'Rate': pd.Series(dtype=float)})
+    rates = pd.read_csv(path, parse_dates=['Date'])
+    missing = {'Date', 'Currency', 'Rate'} - set(rates.columns)
+    if missing:
+        raise ValueError(f"Rate file {path} is missing columns: {', '.join(sorted(missing))}")
+    rates['Currency'] = rates['Currency'].str.strip().str.upper()
+    return rates.sort_values(['Currency', 'Date'], ignore_index=True)
+
+
+def latest_rates(rates):
+    """Most recent rate per currency, including the defaults not in the table"""
+    latest = dict(DEFAULT_RATES)
+    if not rates.empty:
+        latest.update(rates.groupby('Currency')['Rate'].last().to_dict())
+    return latest
+
+
+def _row_rates(currency, dates, rates):
+    """Rate to BASE_CURRENCY for every row, as of each row's date"""
+    row_rates = np.ones(len(currency))
+    dates = dates.to_numpy(dtype='datetime64[ns]')
+    for code in currency.unique():
+        if pd.isna(code) or code == BASE_CURRENCY:
+            continue
+        rows = (currency == code).to_numpy(dtype=bool, na_value=False)
+        table = rates[rates['Currency'] == code]
+        if not table.empty:
+            # As-of lookup: latest rate dated on or before the row's Date
+            rate_dates = table['Date'].to_numpy(dtype='datetime64[ns]')
+            idx = np.searchsorted(rate_dates, dates[rows], side='right') - 1
+            row_rates[rows] = table['Rate'].to_numpy()[np.maximum(idx, 0)]
+        elif code in DEFAULT_RATES:
+            row_rates[rows] = DEFAULT_RATES[code]
+        else:
+            raise ValueError(f"No exchange rate for currency {code}")
+    return row_rates
+
+
+def normalize_currency(df, rates):
+    """Convert all amount columns of ``df`` to BASE_CURRENCY in one block"""
+    if 'Currency' not in df.columns or df.empty:
+        return df
+    currency = df['Currency'].astype('string').str.upper()
+    row_rates = _row_rates(currency, df['Date'], rates)
+
+    columns = [col for col in AMOUNT_COLUMNS if col in df.columns]
+    if columns:
+        # Multiply in float64, store back in the block's own dtype
+        dtype = np.result_type(*df[columns].dtypes)
+        df[columns] = (df[columns].to_numpy(dtype='float64') * row_rates[:, None]).astype(dtype)
+
+    df['Original_Currency'] = currency.astype('category')
+    df['FX_Rate'] = row_rates
+    df['Currency'] = pd.Categorical.from_codes(np.zeros(len(df), dtype='int8'), categories=[BASE_CURRENCY])
+    return df
+
+
+def original_amount(df, column):
+    """``column`` in each row's original currency"""
+    return df[column] / df['FX_Rate']
@@ -0,0 +1,177 @@
+"""Chunked exports of the filtered rows and the analytics tables.
+
+An export is written to a file under ``.data_cache/exports/`` by a writer
+that consumes a generator of row chunks (CHUNK_ROWS rows at a time), so
+the writers never build a second copy of the rows (a CSV string, a whole
+Arrow table or an in-memory workbook). The exported frame itself comes
+from the session's DataStore (row exports are the filter's slice of its
+frames), so a file holds exactly the data the dashboard shows.
+
+The file name is the export key (table, date range, a hash of the Line
+selection, the store's data key, format): an export that was already
+written, by any session, is served from its file. The data key is the
+same in every process that loaded the same data, so processes sharing the
+cache directory share the files too; a write removes the files of other
+data keys.
+"""
+import hashlib
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+import queries
+from analytics import kpi_table, metrics_table
+from ingest import CACHE_DIR
+
+EXPORT_DIR = os.path.join(CACHE_DIR, 'exports')
+CHUNK_ROWS = 50_000
+
+# Rows per sheet in an XLSX file, the header row included
+XLSX_MAX_ROWS = 1_048_576
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Exportable tables: filtered rows of the store, and the analytics tables
+ROW_TABLES = ['deposit', 'withdraw', 'member']
+ANALYTICS_TABLES = ['line_performance', 'metrics', 'kpi']
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    """Consecutive row slices of ``df`` (views, not copies); an empty frame once"""
+    if df.empty:
+        yield df
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(chunks, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def write_parquet(chunks, path):
+    """One row group per chunk"""
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_xlsx(chunks, path, sheet_name='Data'):
+    """Streamed with a write-only workbook, rows are not kept in memory"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            sheet.append(list(chunk.columns))
+        # float32 amounts via their shortest decimal form (252.382, not 252.38201904296875),
+        # then plain Python values with missing values as empty cells
+        float32 = [col for col, dtype in chunk.dtypes.items() if dtype == 'float32']
+        if float32:
+            chunk = chunk.astype({col: str for col in float32}).astype({col: 'float64' for col in float32})
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet, 'xlsx': write_xlsx}
+
+
+def export_frame(store, result_cache, table, start_date, end_date, lines=None):
+    """The frame an export of ``table`` writes"""
+    if table in ROW_TABLES:
+        # The store's own rows: the live Parquet store may already hold a newer ingest
+        return store.filter(table, start_date, end_date, queries.normalize_lines(lines))
+    analytics = queries.analytics(store, result_cache, start_date, end_date, lines)
+    if table == 'metrics':
+        return metrics_table(analytics)
+    if table == 'kpi':
+        return kpi_table(analytics)
+    return analytics['line_performance']
+
+
+def export_file_name(table, fmt, start_date, end_date, lines, key):
+    lines = queries.normalize_lines(lines)
+    if lines is None:
+        line_part = 'all'
+    else:
+        # Sanitized names can collide ('A B' and 'A_B'), the hash of the raw selection cannot
+        readable = lines[0] if len(lines) == 1 else f"{len(lines)}lines"
+        readable = ''.join(c if c.isalnum() or c in '-_' else '_' for c in readable)
+        line_part = f"{readable}-{hashlib.sha1('|'.join(lines).encode()).hexdigest()[:10]}"
+    return f"{table}_{start_date}_{end_date}_{line_part}_{key}.{fmt}"
+
+
+class ExportCache:
+    """Export files on disk, each written once per export key"""
+
+    def __init__(self, directory=EXPORT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_write(self, file_name, write):
+        """Path of ``file_name``, calling ``write(path)`` first if it does not exist yet"""
+        path = os.path.join(self.directory, file_name)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(file_name, threading.Lock())
+        # Concurrent requests for one export wait for a single writer
+        with key_lock:
+            if os.path.exists(path):
+                with self._lock:
+                    self.hits += 1
+                return path
+            with self._lock:
+                self.misses += 1
+            # Per process: another process may be writing the same export
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                write(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return path
+
+    def prune(self, key):
+        """Remove exports of other data keys"""
+        suffix = f"_{key}."
+        for name in os.listdir(self.directory):
+            if suffix not in name and not name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def export(self, store, result_cache, table, fmt, start_date, end_date, lines=None):
+        """Path of the export file of ``table`` in format ``fmt`` for the filter"""
+        if fmt not in WRITERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        file_name = export_file_name(table, fmt, start_date, end_date, lines, store.key)
+
+        def write(path):
+            self.prune(store.key)
+            df = export_frame(store, result_cache, table, start_date, end_date, lines)
+            if fmt == 'xlsx' and len(df) >= XLSX_MAX_ROWS:
+                raise ValueError(f"{len(df):,} rows do not fit in one XLSX sheet, use CSV or Parquet")
+            WRITERS[fmt](iter_chunks(df), path)
+
+        return self.get_or_write(file_name, write)
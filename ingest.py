@@ -0,0 +1,465 @@
+"""Incremental columnar ingest for the dashboard's Excel exports.
+
+Export workbooks are discovered in a data directory and each one is parsed
+exactly once. Parsed rows are merged into a Parquet store partitioned by
+Date and Line (``.data_cache/store/<table>/Date=.../Line=.../``), where
+rows of a re-export replace the stored rows with the same key (repeated
+keys within one export are all kept). After every ingest that changed the
+store, a consolidated, uncompressed Arrow IPC snapshot per table is
+written and memory-mapped on load, so a warm start never touches Excel or
+the partition files.
+
+Files are identified by path, mtime, size and SHA-256 of their contents; the
+hash is only recomputed when the stat part changes.
+
+New workbooks are parsed in a pool of worker processes (one workbook per
+task, ``DASHBOARD_INGEST_WORKERS`` processes, default one per core) with
+openpyxl's streaming read-only reader, so a cold start over many exports
+scales with the number of cores. Merging into the store stays sequential
+and in discovery order, so "later exports win" does not depend on which
+worker finished first.
+
+Ingests and partition scans hold ``store_lock``, a lock file in the cache
+directory, so processes sharing one cache (the dashboard and a standalone
+query API) never merge into the same partitions at once or read a
+partition file another process is rewriting.
+"""
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+from openpyxl import load_workbook
+
+from schema import apply_schema, validate_columns
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = '.data_cache'
+MANIFEST_FILE = 'manifest.json'
+LOCK_FILE = 'store.lock'
+DATA_DIR = os.environ.get('DASHBOARD_DATA_DIR', '.')
+
+TABLES = ['deposit', 'withdraw', 'member']
+
+# Export file name patterns per table, e.g. deposit_july06.xlsx, member_reportJanJuly06.xlsx
+EXPORT_PATTERNS = {
+    'deposit': ['deposit*.xlsx'],
+    'withdraw': ['withdraw*.xlsx'],
+    'member': ['member_report*.xlsx'],
+}
+
+# Row identity inside a (Date, Line) partition; later exports win on overlap
+DEDUP_KEYS = {
+    'deposit': ['Unique_Code', 'Date'],
+    'withdraw': ['Unique_Code', 'Date'],
+    'member': ['Unique_Code', 'Date'],
+}
+
+# Worker processes for parsing new workbooks (0 = one per core)
+INGEST_WORKERS = int(os.environ.get('DASHBOARD_INGEST_WORKERS', '0')) or os.cpu_count() or 1
+
+# Rows turned into a frame at a time while streaming a sheet
+PARSE_BATCH_ROWS = 50_000
+
+PARTITION_SCHEMA = pa.schema([('Date', pa.date32()), ('Line', pa.string())])
+
+# Sessions and the source watcher may ingest at the same time
+_INGEST_LOCK = threading.Lock()
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    # msvcrt gives up after 10 one-second retries; an ingest may take longer
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def store_lock(cache_dir=CACHE_DIR):
+    """Exclusive access to the store in ``cache_dir``, across threads and processes"""
+    with _INGEST_LOCK:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, LOCK_FILE), 'a+b') as f:
+            f.seek(0)
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_export(path, table, batch_rows=PARSE_BATCH_ROWS):
+    """First sheet of an export workbook as a frame in the table's schema.
+
+    The sheet is streamed row by row in read-only mode instead of building
+    openpyxl's cell objects for the whole workbook, and every batch of
+    ``batch_rows`` rows is downcast before the next one is read, so peak
+    memory follows one batch of Python values plus the compact frame.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        # Same names as pandas.read_excel for blank header cells
+        columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+        batches = []
+        while True:
+            batch = list(islice(rows, batch_rows))
+            if not batch:
+                break
+            df = pd.DataFrame.from_records(batch, columns=columns).dropna(how='all')
+            batches.append(apply_schema(df, table))
+    finally:
+        workbook.close()
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    # Categories differ per batch, so the concatenated columns are cast once more
+    return pd.concat(batches, ignore_index=True)
+
+
+def parse_export(path, table):
+    """Read, validate and downcast one export file (runs in a worker process)"""
+    df = read_export(path, table)
+    validate_columns(df, table, os.path.basename(path))
+    return apply_schema(df, table)
+
+
+def _parse_exports(jobs, progress=None, workers=INGEST_WORKERS):
+    """Frames of the (path, table) jobs, in job order.
+
+    ``progress(done, total, name)`` is called before the first and after
+    every parsed file.
+    """
+    total = len(jobs)
+    if progress:
+        progress(0, total, None)
+    if total == 1 or workers <= 1:
+        frames = []
+        for path, table in jobs:
+            frames.append(parse_export(path, table))
+            if progress:
+                progress(len(frames), total, os.path.basename(path))
+        return frames
+
+    frames = [None] * total
+    # spawn: forking a process with running threads (Streamlit, the watcher) is not safe
+    executor = ProcessPoolExecutor(max_workers=min(workers, total), mp_context=multiprocessing.get_context('spawn'))
+    try:
+        # Largest files first, so one big member report does not start last
+        order = sorted(range(total), key=lambda i: os.path.getsize(jobs[i][0]), reverse=True)
+        futures = {executor.submit(parse_export, *jobs[i]): i for i in order}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            frames[i] = future.result()
+            if progress:
+                progress(done, total, os.path.basename(jobs[i][0]))
+    finally:
+        executor.shutdown(cancel_futures=True)
+    return frames
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'version': 0, 'ingested': {}, 'snapshots': {}}
+
+
+def _write_manifest(cache_dir, manifest):
+    # Write-then-rename so concurrent sessions never see a half-written file
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def discover_exports(data_dir=DATA_DIR):
+    """Map each table to its export files in ``data_dir``, oldest first"""
+    names = sorted(os.listdir(data_dir))
+    exports = {}
+    for table, patterns in EXPORT_PATTERNS.items():
+        paths = [
+            os.path.abspath(os.path.join(data_dir, name))
+            for name in names
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+        ]
+        exports[table] = sorted(paths, key=os.path.getmtime)
+    return exports
+
+
+def _dedup_key(table, columns):
+    key = [col for col in DEDUP_KEYS[table] if col in columns]
+    # Older exports without Unique_Code fall back to the member name
+    if 'Unique_Code' not in columns and 'User_Name' in columns:
+        key.insert(0, 'User_Name')
+    return key
+
+
+def _store_dataset(store_dir):
+    return ds.dataset(
+        store_dir,
+        format='parquet',
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+        exclude_invalid_files=True,
+    )
+
+
+def _merge_into_store(df, table, store_dir):
+    """Merge parsed rows into their (Date, Line) partitions.
+
+    Only partitions touched by ``df`` are read and rewritten, so the cost of
+    an ingest follows the size of the new export, not of the history.
+    """
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date']).dt.normalize()
+    # Plain strings in the files: per-file dictionaries would not unify across partitions
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].astype(object)
+
+    if os.path.isdir(store_dir):
+        dates = pa.array(df['Date'].unique().date, type=pa.date32())
+        lines = pa.array(df['Line'].unique(), type=pa.string())
+        # Partition pruning: only the directories of the new rows' dates and lines are read
+        existing = _store_dataset(store_dir).to_table(
+            filter=ds.field('Date').isin(dates) & ds.field('Line').isin(lines)
+        ).to_pandas(date_as_object=False)
+        if not existing.empty:
+            existing['Date'] = pd.to_datetime(existing['Date'])
+            # Rows of the new export replace the stored rows with the same key; repeated
+            # keys inside one export are all kept (the analytics sum them)
+            key = [col for col in _dedup_key(table, df.columns) + ['Line'] if col in existing.columns]
+            replaced = pd.MultiIndex.from_frame(existing[key]).isin(pd.MultiIndex.from_frame(df[key]))
+            df = pd.concat([existing[~replaced], df], ignore_index=True)
+
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    date_idx = arrow_table.schema.get_field_index('Date')
+    arrow_table = arrow_table.set_column(date_idx, 'Date', arrow_table['Date'].cast(pa.date32()))
+    # Rows of a partition are contiguous, so a file closed to stay under max_open_files
+    # is never reopened (which would add a part-1 next to a stale part-0)
+    arrow_table = arrow_table.sort_by([('Date', 'ascending'), ('Line', 'ascending')])
+    # A full-history export spans (days x lines) partitions, far more than pyarrow's default 1024
+    n_partitions = len(df[['Date', 'Line']].drop_duplicates())
+    # Rewrites part-0.parquet of every touched partition and leaves all others alone
+    ds.write_dataset(
+        arrow_table,
+        store_dir,
+        format='parquet',
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        max_partitions=max(n_partitions, 1),
+    )
+
+
+def _read_store(store_dir, table):
+    df = _store_dataset(store_dir).to_table().to_pandas(date_as_object=False)
+    df = apply_schema(df, table)
+    # Snapshots are kept in (Date, Line) order
+    return df.sort_values(['Date', 'Line'], kind='stable', ignore_index=True)
+
+
+def _read_snapshot(snapshot_path):
+    # Columns come back backed by the memory map and are read-only
+    return feather.read_table(snapshot_path, memory_map=True).to_pandas()
+
+
+def _write_snapshot(df, snapshot_path):
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    # Uncompressed so the file can be memory-mapped on load
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, snapshot_path)
+
+
+def ingest_directory(data_dir=DATA_DIR, cache_dir=CACHE_DIR, progress=None):
+    """Ingest export files not seen before and refresh changed snapshots.
+
+    Returns the manifest, whose ``version`` increases whenever new data was
+    merged into the store. ``progress(done, total, name)`` is called while
+    new files are parsed.
+    """
+    with store_lock(cache_dir):
+        return _ingest_directory(data_dir, cache_dir, progress)
+
+
+def _ingest_directory(data_dir, cache_dir, progress=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _read_manifest(cache_dir)
+    ingested = manifest['ingested']
+    seen_hashes = {entry['sha256'] for entry in ingested.values()}
+    changed_tables = set()
+
+    # Files whose contents are new, in discovery order; all others only get their entry refreshed
+    jobs = []
+    for table, paths in discover_exports(data_dir).items():
+        for path in paths:
+            stat = os.stat(path)
+            entry = ingested.get(path)
+            if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                continue
+            digest = hash_file(path)
+            if digest not in seen_hashes:
+                jobs.append((path, table))
+                seen_hashes.add(digest)
+            ingested[path] = {
+                'table': table,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha256': digest,
+            }
+
+    # Header-only exports write no partition; they only give a table without rows its columns
+    empty_exports = {}
+    if jobs:
+        for (path, table), df in zip(jobs, _parse_exports(jobs, progress)):
+            if df.empty:
+                empty_exports[table] = df
+                continue
+            _merge_into_store(df, table, os.path.join(cache_dir, 'store', table))
+            changed_tables.add(table)
+
+    if changed_tables:
+        manifest['version'] += 1
+    for table in TABLES:
+        store_dir = os.path.join(cache_dir, 'store', table)
+        snapshot_path = os.path.join(cache_dir, f"{table}.arrow")
+        if table in changed_tables or (os.path.isdir(store_dir) and not os.path.exists(snapshot_path)):
+            _write_snapshot(_read_store(store_dir, table), snapshot_path)
+            manifest['snapshots'][table] = manifest['version']
+        elif table in empty_exports and not os.path.isdir(store_dir) and not os.path.exists(snapshot_path):
+            _write_snapshot(apply_schema(empty_exports[table], table), snapshot_path)
+            manifest['snapshots'][table] = manifest['version']
+
+    _write_manifest(cache_dir, manifest)
+    return manifest
+
+
+def _partition_files(store_dir, start_date, end_date, lines):
+    """Parquet files of the (Date, Line) partitions in the range, without walking the rest of the store"""
+    start = pd.Timestamp(start_date).date().isoformat() if start_date is not None else None
+    end = pd.Timestamp(end_date).date().isoformat() if end_date is not None else None
+    files = []
+    for date_dir in sorted(os.listdir(store_dir)):
+        day = date_dir.partition('=')[2]
+        # ISO dates compare like the dates they name
+        if not date_dir.startswith('Date=') or (start and day < start) or (end and day > end):
+            continue
+        date_path = os.path.join(store_dir, date_dir)
+        if lines is None:
+            line_dirs = sorted(os.listdir(date_path))
+        else:
+            line_dirs = [f"Line={quote(str(line), safe='')}" for line in sorted(lines)]
+        for line_dir in line_dirs:
+            line_path = os.path.join(date_path, line_dir)
+            if os.path.isdir(line_path):
+                files.extend(os.path.join(line_path, name) for name in sorted(os.listdir(line_path)) if name.endswith('.parquet'))
+    return files
+
+
+def scan_table(table, start_date=None, end_date=None, lines=None, columns=None, filter=None, cache_dir=CACHE_DIR):
+    """Rows of ``table`` read from the Parquet store with the predicates pushed down.
+
+    The Date range and Lines prune partition directories before any file is
+    opened, an extra pyarrow ``filter`` expression is checked against the
+    row-group statistics of the remaining files, and only ``columns`` (all
+    if None) are read. The result is in (Date, Line) order like the
+    snapshots; its size follows the filter, not the length of the history.
+    """
+    store_dir = os.path.join(cache_dir, 'store', table)
+    expression = None
+    if start_date is not None:
+        expression = ds.field('Date') >= pa.scalar(pd.Timestamp(start_date).date(), pa.date32())
+    if end_date is not None:
+        upper = ds.field('Date') <= pa.scalar(pd.Timestamp(end_date).date(), pa.date32())
+        expression = upper if expression is None else expression & upper
+    if lines is not None:
+        line_filter = ds.field('Line').isin(pa.array(list(lines), type=pa.string()))
+        expression = line_filter if expression is None else expression & line_filter
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+
+    # A partition file being rewritten by an ingest (of any process) is never read half-written
+    with store_lock(cache_dir):
+        if not os.path.isdir(store_dir):
+            raise FileNotFoundError(f"No {table} export files have been ingested")
+        files = _partition_files(store_dir, start_date, end_date, lines)
+        if files:
+            dataset = ds.dataset(
+                files,
+                format='parquet',
+                partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+                partition_base_dir=store_dir,
+            )
+        else:
+            # Nothing in range: an empty table with the store's columns
+            dataset = ds.dataset(_store_dataset(store_dir).schema.empty_table())
+        if columns is not None:
+            columns = [col for col in dataset.schema.names if col in set(columns) | {'Date', 'Line'}]
+        arrow_table = dataset.to_table(columns=columns, filter=expression)
+    df = apply_schema(arrow_table.to_pandas(date_as_object=False), table)
+    return df.sort_values(['Date', 'Line'], kind='stable', ignore_index=True)
+
+
+def load_table(table, cache_dir=CACHE_DIR):
+    """Load one table's snapshot from the columnar cache"""
+    snapshot_path = os.path.join(cache_dir, f"{table}.arrow")
+    if not os.path.exists(snapshot_path):
+        raise FileNotFoundError(f"No {table} export files have been ingested")
+    return _read_snapshot(snapshot_path)
+
+
+def load_snapshots(cache_dir=CACHE_DIR):
+    """Deposit, withdraw and member snapshots and the manifest version each was written at.
+
+    Read under the store lock, so the versions are those of the snapshots
+    returned even while another process ingests.
+    """
+    with store_lock(cache_dir):
+        written = _read_manifest(cache_dir)['snapshots']
+        return {table: written.get(table) for table in TABLES}, tuple(load_table(table, cache_dir) for table in TABLES)
+
+
+def load_tables(data_dir=DATA_DIR, cache_dir=CACHE_DIR, progress=None):
+    """Ingest new exports from ``data_dir`` and return deposit, withdraw and member frames"""
+    ingest_directory(data_dir, cache_dir, progress)
+    return load_snapshots(cache_dir)[1]
@@ -0,0 +1,184 @@
+"""Per-member lookups: a member's rows in every table without scanning them.
+
+Built once with the data store. Members get integer ids in the order of
+their sorted names (the union of the User_Name values of the three
+tables). For each table the index keeps the row positions sorted by
+member id, plus ``offsets``: a member's rows are
+``order[offsets[id]:offsets[id + 1]]``. The sort is stable, so those rows
+stay in the frame's Date order.
+
+Name search runs on the sorted names:
+
+* a lookup is a binary search in the names,
+* a prefix search is a binary search for the range of lowercased names
+  starting with the query,
+* the fuzzy fallback ranks names that share a shorter prefix with the
+  query by their similarity to it (typos near the end of a name).
+
+Unique_Code values map to members through a sorted (code, member id) table.
+"""
+import difflib
+
+import numpy as np
+import pandas as pd
+
+from metrics import evaluate, winrate_components
+
+# Per-day sums of a member's rows: (table, column, output column)
+MEMBER_DAILY_SUMS = [
+    ('deposit', 'Deposit_Amount', 'Deposit'),
+    ('deposit', 'Deposit_Cases', 'Deposit_Cases'),
+    ('withdraw', 'Withdraw_Amount', 'Withdraw'),
+    ('withdraw', 'Withdraw_Cases', 'Withdraw_Cases'),
+    ('member', 'GGR', 'GGR'),
+    ('member', 'Net_Profit', 'Net_Profit'),
+    ('member', 'Add_Bonus', 'Add_Bonus'),
+    ('member', 'Deduct_Bonus', 'Deduct_Bonus'),
+    ('member', 'Cases_Bets', 'Cases_Bets'),
+    ('member', 'Bets_Amount', 'Bets_Amount'),
+]
+
+# Names the fuzzy search compares with the query at most
+FUZZY_CANDIDATES = 2_000
+
+
+def _categorical(values):
+    return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+
+
+def _categories(values):
+    """Category values as strings (exports may hold numeric names or codes)"""
+    categories = _categorical(values).cat.categories
+    if not pd.api.types.is_string_dtype(categories.dtype):
+        categories = categories.astype(str)
+    return categories.to_numpy(dtype=object)
+
+
+def _ids(values, names):
+    """Positions of the values of a column in the ``names`` index (-1 for missing)"""
+    values = _categorical(values)
+    lookup = names.get_indexer(_categories(values))
+    codes = values.cat.codes.to_numpy()
+    return np.where(codes >= 0, lookup[codes], -1) if len(lookup) else np.full(len(codes), -1)
+
+
+class MemberIndex:
+    """Row positions per member in each table, and search over member names and codes"""
+
+    def __init__(self, tables):
+        frames = {table: df for table, df in tables.items() if 'User_Name' in df.columns}
+        categories = [_categories(df['User_Name']) for df in frames.values()]
+        # Hash-based union of the per-table categories, then one sort
+        names = pd.unique(np.concatenate(categories)) if categories else np.array([], dtype=object)
+        self.names = np.sort(np.asarray(names, dtype=object))
+        name_index = pd.Index(self.names)
+        n_members = len(self.names)
+
+        self.order = {}
+        self.offsets = {}
+        codes = []
+        for table, df in frames.items():
+            ids = _ids(df['User_Name'], name_index)
+            valid = np.flatnonzero(ids >= 0)
+            position_dtype = np.int32 if len(df) < 2**31 else np.int64
+            self.order[table] = valid[np.argsort(ids[valid], kind='stable')].astype(position_dtype)
+            self.offsets[table] = np.concatenate([[0], np.cumsum(np.bincount(ids[valid], minlength=n_members))])
+            if 'Unique_Code' in df.columns:
+                code = _categorical(df['Unique_Code'])
+                pairs = pd.unique(code.cat.codes.to_numpy().astype(np.int64) * (n_members + 1) + ids + 1)
+                pairs = pairs[(pairs >= n_members + 1) & (pairs % (n_members + 1) > 0)]
+                codes.append(pd.DataFrame({
+                    'code': _categories(code)[pairs // (n_members + 1)],
+                    'member': pairs % (n_members + 1) - 1,
+                }))
+
+        # Sorted lowercase names for case-insensitive prefix search, and the ids they belong to
+        lower = np.char.lower(self.names.astype(str)).astype(object) if n_members else self.names
+        self.search_order = np.argsort(lower, kind='stable')
+        self.search_keys = lower[self.search_order]
+
+        codes = pd.concat(codes).drop_duplicates().sort_values(['code', 'member']) if codes else pd.DataFrame({'code': [], 'member': []})
+        self.codes = codes['code'].to_numpy(dtype=object)
+        self.code_members = codes['member'].to_numpy(dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name):
+        """Member id of the exact name, or None"""
+        i = int(np.searchsorted(self.names, name))
+        return i if i < len(self.names) and self.names[i] == name else None
+
+    def find_code(self, code):
+        """Names of the members a Unique_Code belongs to"""
+        lo = np.searchsorted(self.codes, code, side='left')
+        hi = np.searchsorted(self.codes, code, side='right')
+        return list(self.names[self.code_members[lo:hi]])
+
+    def rows(self, table, member_id):
+        """Positions of a member's rows in ``table``, in Date order"""
+        if table not in self.order:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.offsets[table]
+        return self.order[table][offsets[member_id]:offsets[member_id + 1]]
+
+    def _prefix_range(self, prefix):
+        # Every key starting with ``prefix`` sorts between it and prefix + the highest code point
+        lo = np.searchsorted(self.search_keys, prefix, side='left')
+        hi = np.searchsorted(self.search_keys, prefix + '\U0010ffff', side='left')
+        return int(lo), int(hi)
+
+    def search(self, query, limit=20):
+        """Member names for ``query``: exact Unique_Code owners, then prefix matches, then close names"""
+        query = query.strip()
+        if not query:
+            return []
+        found = dict.fromkeys(self.find_code(query))
+        lo, hi = self._prefix_range(query.lower())
+        found.update(dict.fromkeys(self.names[self.search_order[lo:min(hi, lo + limit)]]))
+        if len(found) < limit:
+            found.update(dict.fromkeys(self.fuzzy(query, limit - len(found))))
+        return list(found)[:limit]
+
+    def fuzzy(self, query, limit=10, cutoff=0.6):
+        """Names similar to ``query``, taken from the longest shorter prefix with candidates"""
+        key = query.lower()
+        for length in range(len(key) - 1, 0, -1):
+            lo, hi = self._prefix_range(key[:length])
+            if hi > lo:
+                break
+        else:
+            return []
+        candidates = self.search_keys[lo:min(hi, lo + FUZZY_CANDIDATES)]
+        matches = difflib.get_close_matches(key, list(candidates), n=limit, cutoff=cutoff)
+        positions = lo + np.searchsorted(candidates, np.asarray(matches, dtype=object))
+        return list(self.names[self.search_order[positions]])
+
+
+def weighted_winrate(member_rows, by=None):
+    """Win rate weighted by Cases_Bets (metrics.KPIS) of member rows, overall or per ``by`` group"""
+    if not {'Winrate', 'Cases_Bets'} <= set(member_rows.columns):
+        return np.nan if by is None else pd.Series(dtype='float64')
+    weighted, bets = winrate_components(member_rows)
+    parts = pd.DataFrame({'total_winrate_weighted': weighted, 'total_winrate_bets': bets}, index=member_rows.index)
+    parts = parts.sum() if by is None else parts.groupby(by, observed=True).sum()
+    winrate = evaluate(parts, ['overall_winrate'], empty=np.nan)['overall_winrate']
+    return winrate if by is None else pd.Series(winrate, index=parts.index)
+
+
+def member_daily(rows):
+    """Per-day sums and weighted win rate of a member's rows ({table: frame}) across all Lines"""
+    daily = []
+    for table, df in rows.items():
+        columns = {col: name for source, col, name in MEMBER_DAILY_SUMS if source == table and col in df.columns}
+        if df.empty or not columns:
+            continue
+        day = df['Date'].dt.normalize().rename('Date')
+        sums = df[list(columns)].astype('float64').groupby(day).sum().rename(columns=columns)
+        if table == 'member':
+            sums['Winrate'] = weighted_winrate(df, day)
+        daily.append(sums)
+    if not daily:
+        return pd.DataFrame()
+    daily = pd.concat(daily, axis=1).sort_index()
+    return daily.fillna({col: 0.0 for col in daily.columns if col != 'Winrate'}).reset_index()
@@ -0,0 +1,87 @@
+"""KPI definitions over additive measures.
+
+Every derived metric is declared once in ``KPIS`` as a numerator over a
+denominator, each a linear combination of additive measures (the summed
+totals of the analytics, e.g. ``total_ggr``). Because the components are
+sums, they can be pre-aggregated per (Date, Line) and rolled up over any
+date range, set of Lines or period, and the ratio is taken only at the
+end, which keeps ratio metrics correct under roll-ups (a mean of daily
+ratios is not the ratio of the period).
+
+``evaluate`` computes all KPIs for any number of slices at once: the
+measures are stacked into one array and every numerator and denominator
+is a row of a coefficient matrix, so one matrix product per side gives
+every KPI of every slice.
+
+The win rate is weighted by Cases_Bets: its numerator is the sum of
+``Winrate * Cases_Bets`` and its denominator the bets of the rows that
+have a Winrate, so members who placed more bets count for more and a
+member-day without bets counts for nothing.
+"""
+import numpy as np
+
+# Additive components of the weighted win rate, as cube measures and analytics totals
+WINRATE_WEIGHTED = 'Winrate_Weighted'
+WINRATE_BETS = 'Winrate_Bets'
+
+
+class Metric:
+    """A KPI: numerator / denominator, both {measure: coefficient}; no denominator = 1"""
+
+    def __init__(self, numerator, denominator=None, scale=1.0):
+        self.numerator = numerator
+        self.denominator = denominator or {}
+        self.scale = scale
+
+
+KPIS = {
+    'net_bonus': Metric({'total_bonus_given': 1, 'total_bonus_deducted': -1}),
+    'avg_deposit_per_case': Metric({'total_deposit': 1}, {'total_deposit_cases': 1}),
+    'avg_withdraw_per_case': Metric({'total_withdraw': 1}, {'total_withdraw_cases': 1}),
+    'avg_ggr_per_member': Metric({'total_ggr': 1}, {'total_active_members': 1}),
+    'overall_winrate': Metric({'total_winrate_weighted': 1}, {'total_winrate_bets': 1}),
+    'deposit_to_withdraw_ratio': Metric({'total_deposit': 1}, {'total_withdraw': 1}),
+    'withdraw_to_deposit_ratio': Metric({'total_withdraw': 1}, {'total_deposit': 1}),
+    'ggr_margin': Metric({'total_ggr': 1}, {'total_deposit': 1}, scale=100),
+    'valid_bet_ratio': Metric({'total_valid_amount': 1}, {'total_bets_amount': 1}, scale=100),
+}
+
+
+def winrate_components(df):
+    """Per-row ``Winrate * Cases_Bets`` and the bets it is weighted by (0 where Winrate is missing)"""
+    winrate = df['Winrate'].to_numpy(dtype='float64', na_value=np.nan)
+    bets = np.where(np.isnan(winrate), 0.0, df['Cases_Bets'].to_numpy(dtype='float64', na_value=0.0))
+    return np.nan_to_num(winrate) * bets, bets
+
+
+def evaluate(totals, kpis=None, empty=0.0):
+    """``kpis`` (names from KPIS, default all) of the measure ``totals``.
+
+    ``totals`` maps measure names to scalars or same-shaped arrays (one
+    value per slice); the result maps each KPI to a value of that shape.
+    A zero denominator gives ``empty``.
+    """
+    kpis = list(KPIS) if kpis is None else list(kpis)
+    measures = sorted({m for name in kpis for side in (KPIS[name].numerator, KPIS[name].denominator) for m in side})
+    values = np.stack([np.asarray(totals[m], dtype='float64') for m in measures])
+    index = {m: i for i, m in enumerate(measures)}
+
+    numerator = np.zeros((len(kpis), len(measures)))
+    denominator = np.zeros((len(kpis), len(measures)))
+    for k, name in enumerate(kpis):
+        metric = KPIS[name]
+        for m, coefficient in metric.numerator.items():
+            numerator[k, index[m]] = coefficient * metric.scale
+        for m, coefficient in metric.denominator.items():
+            denominator[k, index[m]] = coefficient
+    # KPIs without a denominator divide by 1
+    ones = ~denominator.any(axis=1)
+
+    num = np.tensordot(numerator, values, axes=1)
+    den = np.tensordot(denominator, values, axes=1)
+    den[ones] = 1.0
+    result = np.full(num.shape, empty, dtype='float64')
+    np.divide(num, den, out=result, where=den != 0)
+    if result.ndim == 1:
+        return {name: float(result[k]) for k, name in enumerate(kpis)}
+    return {name: result[k] for k, name in enumerate(kpis)}
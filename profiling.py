@@ -0,0 +1,244 @@
+"""Opt-in per-rerun profiling of the dashboard script.
+
+With ``DASHBOARD_PROFILE=1`` every script run (a full rerun or a fragment
+rerun) records the wall time and the memory allocated by each named stage,
+plus the hits and misses of the registered caches during the run. Finished
+runs are kept in memory for the admin panel and appended to a local file,
+as one JSON line per run (``DASHBOARD_PROFILE_FORMAT=jsonl``, the default)
+or as a Prometheus text-format file with cumulative totals per stage
+(``prometheus``, e.g. for node_exporter's textfile collector).
+
+Memory is measured with tracemalloc, which is only started when profiling
+is on: ``allocated`` is the net growth of traced memory over the stage and
+``peak`` the highest traced memory above the stage's start. tracemalloc is
+process-wide, so sessions running at the same time show up in each other's
+numbers. When profiling is off, ``stage`` hands out one shared no-op
+context manager and nothing else runs.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from ingest import CACHE_DIR
+
+PROFILE_ENABLED = os.environ.get('DASHBOARD_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+PROFILE_FORMAT = os.environ.get('DASHBOARD_PROFILE_FORMAT', 'jsonl')
+PROFILE_FILE = os.environ.get(
+    'DASHBOARD_PROFILE_FILE',
+    os.path.join(CACHE_DIR, 'profile.prom' if PROFILE_FORMAT == 'prometheus' else 'profile.jsonl'),
+)
+
+# Finished runs kept for the admin panel
+HISTORY_SIZE = 200
+
+_NOOP = nullcontext()
+
+
+class RerunProfile:
+    """Stages and cache activity of one script run"""
+
+    def __init__(self, label, session):
+        self.label = label
+        self.session = session
+        self.started = datetime.now()
+        self.stages = []
+        self.cache = {}
+        self.seconds = None
+        # Open stages: [name, start time, traced memory at start, highest peak seen]
+        self._stack = []
+
+    def as_dict(self):
+        return {
+            'time': self.started.isoformat(timespec='milliseconds'),
+            'session': self.session,
+            'run': self.label,
+            'ms': round(self.seconds * 1000, 2) if self.seconds is not None else None,
+            'stages': self.stages,
+            'cache': self.cache,
+        }
+
+
+class Profiler:
+    """Collects RerunProfiles of the current thread's script run"""
+
+    def __init__(self, enabled=PROFILE_ENABLED, path=PROFILE_FILE, fmt=PROFILE_FORMAT, history=HISTORY_SIZE):
+        if fmt not in ('jsonl', 'prometheus'):
+            raise ValueError(f"Unknown profile format: {fmt} (use jsonl or prometheus)")
+        self.enabled = enabled
+        self.path = path
+        self.format = fmt
+        self.history = deque(maxlen=history)
+        self._caches = {}
+        self._totals = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def watch_cache(self, name, stats):
+        """Report hits/misses of ``stats()`` (a dict with 'hits' and 'misses') per run"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def current(self):
+        return getattr(self._local, 'profile', None)
+
+    @contextmanager
+    def _rerun(self, label, session):
+        profile = RerunProfile(label, session)
+        with self._lock:
+            caches = dict(self._caches)
+        before = {name: stats() for name, stats in caches.items()}
+        self._local.profile = profile
+        started = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.seconds = time.perf_counter() - started
+            self._local.profile = None
+            for name, stats in caches.items():
+                after = stats()
+                profile.cache[name] = {
+                    'hits': after['hits'] - before[name]['hits'],
+                    'misses': after['misses'] - before[name]['misses'],
+                }
+            self._finish(profile)
+
+    def rerun(self, label, session=None):
+        """Context manager around one script run; a no-op when disabled"""
+        if not self.enabled:
+            return _NOOP
+        return self._rerun(label, session)
+
+    @contextmanager
+    def _stage(self, profile, name):
+        traced, peak = tracemalloc.get_traced_memory()
+        if profile._stack:
+            # The enclosing stage keeps the peak it saw before ours resets it
+            profile._stack[-1][3] = max(profile._stack[-1][3], peak)
+        tracemalloc.reset_peak()
+        frame = [name, time.perf_counter(), traced, traced]
+        profile._stack.append(frame)
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - frame[1]
+            traced, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame[3])
+            profile._stack.pop()
+            if profile._stack:
+                profile._stack[-1][3] = max(profile._stack[-1][3], peak)
+            profile.stages.append({
+                'stage': '/'.join([*(open_frame[0] for open_frame in profile._stack), name]),
+                'ms': round(seconds * 1000, 2),
+                'allocated_kb': round((traced - frame[2]) / 1024, 1),
+                'peak_kb': round((peak - frame[2]) / 1024, 1),
+            })
+
+    def stage(self, name, session=None):
+        """Context manager timing a named stage of the current run.
+
+        Outside a run (a fragment rerunning on its own) the stage is
+        recorded as a run of its own.
+        """
+        if not self.enabled:
+            return _NOOP
+        profile = self.current()
+        if profile is None:
+            return self._fragment_run(name, session)
+        return self._stage(profile, name)
+
+    @contextmanager
+    def _fragment_run(self, name, session):
+        with self._rerun(f"fragment {name}", session) as profile:
+            with self._stage(profile, name):
+                yield
+
+    def recent(self, session=None):
+        """Finished runs, newest last; only those of ``session`` if given"""
+        with self._lock:
+            runs = list(self.history)
+        return [run for run in runs if session is None or run['session'] == session]
+
+    def _finish(self, profile):
+        record = profile.as_dict()
+        with self._lock:
+            self.history.append(record)
+            self._accumulate(record)
+            try:
+                if self.format == 'prometheus':
+                    self._write_prometheus()
+                else:
+                    self._append_jsonl(record)
+            except OSError:
+                # Profiling must never break the page
+                pass
+
+    def _accumulate(self, record):
+        totals = self._totals
+        totals['runs'] = totals.get('runs', 0) + 1
+        totals['run_seconds'] = totals.get('run_seconds', 0.0) + record['ms'] / 1000
+        for stage in record['stages']:
+            entry = totals.setdefault('stages', {}).setdefault(stage['stage'], {'count': 0, 'seconds': 0.0, 'peak_bytes': 0})
+            entry['count'] += 1
+            entry['seconds'] += stage['ms'] / 1000
+            entry['peak_bytes'] = max(entry['peak_bytes'], int(stage['peak_kb'] * 1024))
+        for name, counts in record['cache'].items():
+            entry = totals.setdefault('cache', {}).setdefault(name, {'hits': 0, 'misses': 0})
+            entry['hits'] += counts['hits']
+            entry['misses'] += counts['misses']
+
+    def _append_jsonl(self, record):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def _write_prometheus(self):
+        totals = self._totals
+        lines = [
+            '# HELP dashboard_runs_total Script runs (full and fragment reruns).',
+            '# TYPE dashboard_runs_total counter',
+            f"dashboard_runs_total {totals['runs']}",
+            '# HELP dashboard_run_seconds_total Wall time of all script runs.',
+            '# TYPE dashboard_run_seconds_total counter',
+            f"dashboard_run_seconds_total {totals['run_seconds']:.6f}",
+            '# HELP dashboard_stage_seconds Wall time per stage.',
+            '# TYPE dashboard_stage_seconds summary',
+        ]
+        stages = totals.get('stages', {})
+        for name, entry in sorted(stages.items()):
+            label = _label(name)
+            lines.append(f'dashboard_stage_seconds_sum{{stage="{label}"}} {entry["seconds"]:.6f}')
+            lines.append(f'dashboard_stage_seconds_count{{stage="{label}"}} {entry["count"]}')
+        lines += [
+            '# HELP dashboard_stage_peak_bytes Highest traced memory above the stage start.',
+            '# TYPE dashboard_stage_peak_bytes gauge',
+        ]
+        for name, entry in sorted(stages.items()):
+            lines.append(f'dashboard_stage_peak_bytes{{stage="{_label(name)}"}} {entry["peak_bytes"]}')
+        lines += [
+            '# HELP dashboard_cache_requests_total Cache lookups during script runs.',
+            '# TYPE dashboard_cache_requests_total counter',
+        ]
+        for name, entry in sorted(totals.get('cache', {}).items()):
+            lines.append(f'dashboard_cache_requests_total{{cache="{_label(name)}",result="hit"}} {entry["hits"]}')
+            lines.append(f'dashboard_cache_requests_total{{cache="{_label(name)}",result="miss"}} {entry["misses"]}')
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        # Scrapers never see a half-written file
+        os.replace(tmp_path, self.path)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+PROFILER = Profiler()
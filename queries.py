@@ -0,0 +1,49 @@
+"""Cached dashboard queries, shared by the Streamlit page and the query API.
+
+Both front ends go through these functions with the same ``ResultCache``
+when they run in one process, so a filter computed for one of them is a
+cache hit for the other. Keys are (query, start date, end date, Line
+selection, data version), with the tuple of compared date ranges in place
+of start and end for comparisons; a Line selection is None (all lines) or
+a tuple (empty when no Line is selected, which selects no rows).
+"""
+from analytics import calculate_cube_analytics, calculate_cube_comparison, calculate_cube_time_series
+
+
+def normalize_lines(lines):
+    """Hashable Line selection: None for all lines, else a sorted tuple (empty = no lines)"""
+    if lines is None:
+        return None
+    return tuple(sorted(set(lines)))
+
+
+def query_key(query, start_date, end_date, lines, version):
+    return (query, start_date, end_date, normalize_lines(lines), version)
+
+
+def analytics(store, cache, start_date, end_date, lines=None):
+    """calculate_cube_analytics for the filter, memoized in ``cache``"""
+    lines = normalize_lines(lines)
+    return cache.get_or_compute(
+        query_key('analytics', start_date, end_date, lines, store.version),
+        lambda: calculate_cube_analytics(store.cube, start_date, end_date, lines),
+    )
+
+
+def comparison(store, cache, periods, lines=None):
+    """calculate_cube_comparison of the (start_date, end_date) periods, memoized in ``cache``"""
+    lines = normalize_lines(lines)
+    periods = tuple(periods)
+    return cache.get_or_compute(
+        ('comparison', periods, lines, store.version),
+        lambda: calculate_cube_comparison(store.cube, periods, lines),
+    )
+
+
+def time_series(store, cache, start_date, end_date, lines=None):
+    """Daily, weekly and monthly series for the filter, memoized in ``cache``"""
+    lines = normalize_lines(lines)
+    return cache.get_or_compute(
+        query_key('time_series', start_date, end_date, lines, store.version),
+        lambda: calculate_cube_time_series(store.cube, start_date, end_date, lines),
+    )
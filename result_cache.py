@@ -0,0 +1,54 @@
+"""Bounded LRU cache for computed analytics results.
+
+One instance is shared by all sessions of a process. Keys are built from
+the filter (date range, Line selection) plus the data version, so results
+of an older data load are never served and simply age out. Cached values
+are shared between sessions and must not be modified by callers.
+"""
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache with hit/miss counters"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Computed outside the lock so one slow query does not block other sessions
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,102 @@
+"""Column schema for the deposit, withdraw and member frames.
+
+Repeated strings are stored as categoricals, counts as int32 and amounts as
+float32. float32 keeps about 7 significant digits, i.e. cent precision on
+per-row amounts up to roughly RM 100,000; totals are accumulated in float64
+by the cube. Columns not listed here are kept as they are.
+"""
+import pandas as pd
+
+
+class SchemaError(ValueError):
+    """An export is missing columns the dashboard needs"""
+
+
+# Columns shared by all three tables
+_COMMON = {
+    'Date': 'datetime64[ns]',
+    'User_Name': 'category',
+    'Unique_Code': 'category',
+    'Line': 'category',
+    'Currency': 'category',
+    'Original_Currency': 'category',
+    'FX_Rate': 'float32',
+}
+
+SCHEMAS = {
+    'deposit': {
+        **_COMMON,
+        'Deposit_Amount': 'float32',
+        'Deposit_Cases': 'int32',
+    },
+    'withdraw': {
+        **_COMMON,
+        'Withdraw_Amount': 'float32',
+        'Withdraw_Cases': 'int32',
+    },
+    'member': {
+        **_COMMON,
+        'Month': 'category',
+        'Deposit_Amount': 'float32',
+        'Withdraw_Amount': 'float32',
+        'Bonus': 'float32',
+        'Add_Bonus': 'float32',
+        'Deduct_Bonus': 'float32',
+        'Add_Transaction': 'float32',
+        'Deduct_Transaction': 'float32',
+        'Cases_Bets': 'int32',
+        'Bets_Amount': 'float32',
+        'Valid_Amount': 'float32',
+        'GGR': 'float32',
+        'Net_Profit': 'float32',
+        'Winrate': 'float32',
+    },
+}
+
+REQUIRED_COLUMNS = {
+    'deposit': ['Date', 'User_Name', 'Unique_Code', 'Line', 'Deposit_Amount', 'Deposit_Cases'],
+    'withdraw': ['Date', 'User_Name', 'Unique_Code', 'Line', 'Withdraw_Amount', 'Withdraw_Cases'],
+    'member': [
+        'Date', 'User_Name', 'Line', 'Deposit_Amount', 'Withdraw_Amount', 'Add_Bonus', 'Deduct_Bonus',
+        'Cases_Bets', 'Bets_Amount', 'Valid_Amount', 'GGR', 'Net_Profit', 'Winrate',
+    ],
+}
+
+
+def validate_columns(df, table, source=None):
+    """Raise SchemaError if ``df`` lacks a column required for ``table``"""
+    missing = [col for col in REQUIRED_COLUMNS[table] if col not in df.columns]
+    if missing:
+        where = f" in {source}" if source else ""
+        raise SchemaError(f"{table} data{where} is missing columns: {', '.join(missing)}")
+
+
+def apply_schema(df, table):
+    """Cast the columns of ``df`` that do not have their schema dtype yet"""
+    schema = SCHEMAS[table]
+    casts = {}
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype.startswith('int'):
+            # Missing counts are summed as zero anyway
+            df[col] = df[col].fillna(0)
+        casts[col] = dtype
+    if 'Date' in casts:
+        df['Date'] = pd.to_datetime(df['Date'])
+    return df.astype(casts) if casts else df
+
+
+def memory_footprint(frames):
+    """Rows and resident memory per frame, e.g. for {'Deposit': deposit_df, ...}"""
+    rows = []
+    for name, df in frames.items():
+        size = int(df.memory_usage(deep=True).sum())
+        rows.append({
+            'Table': name,
+            'Rows': len(df),
+            'Columns': len(df.columns),
+            'Memory (MB)': round(size / 2**20, 2),
+            'Bytes/Row': round(size / len(df), 1) if len(df) else 0,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,141 @@
+"""Process-wide, read-only store of the loaded dashboard data.
+
+One ``DataStore`` is built per process (the app keeps it in
+``st.cache_resource``) and every session gets that same object, so N
+sessions share one copy of the frames and the cube instead of each getting
+its own deserialized copy on every rerun.
+
+The frames must be treated as read-only. Copy-on-Write is enabled, so the
+views returned by ``filter`` share memory with the store until something
+writes to them, and such a write never reaches the shared frames.
+"""
+import hashlib
+
+import pandas as pd
+
+from analytics import DailyCube, slice_by_date
+from currency import RATES_FILE, load_rate_table, normalize_currency
+from ingest import CACHE_DIR, DATA_DIR, TABLES, ingest_directory, load_snapshots, load_tables, scan_table
+from members import MemberIndex
+from schema import apply_schema, memory_footprint, validate_columns
+from topn import TopRows
+
+# Amount column the largest-N lookups rank each table by
+TOP_ROWS_AMOUNT = {'deposit': 'Deposit_Amount', 'withdraw': 'Withdraw_Amount'}
+
+if int(pd.__version__.split('.')[0]) < 3:
+    # Always on from pandas 3
+    pd.set_option('mode.copy_on_write', True)
+
+
+class DataStore:
+    """Loaded frames, their aggregate cube and the data version they belong to"""
+
+    def __init__(self, deposit_df, withdraw_df, member_df, version=0, key=None):
+        self.tables = {'deposit': deposit_df, 'withdraw': withdraw_df, 'member': member_df}
+        self.version = version
+        # Names files derived from the data (exports), which other processes may share
+        self.key = key if key is not None else f"v{version}"
+        self.cube = DailyCube(deposit_df, withdraw_df, member_df)
+        self.top_rows = {
+            table: TopRows(self.tables[table], column, self.cube.dates, self.cube.lines)
+            for table, column in TOP_ROWS_AMOUNT.items()
+            if not self.tables[table].empty
+        }
+        self.member_index = MemberIndex(self.tables)
+        self.footprint = memory_footprint({
+            'Deposit': deposit_df, 'Withdraw': withdraw_df, 'Member': member_df
+        })
+
+    @property
+    def frames(self):
+        """The full deposit, withdraw and member frames"""
+        return self.tables['deposit'], self.tables['withdraw'], self.tables['member']
+
+    def filter(self, table, start_date, end_date, lines=None):
+        """Rows of ``table`` in the date range and on ``lines`` (None = all lines).
+
+        The date range is a positional slice of the Date-sorted frame; only
+        a Line selection builds a new frame.
+        """
+        df = slice_by_date(self.tables[table], start_date, end_date)
+        if lines is not None and 'Line' in df.columns:
+            df = df[df['Line'].isin(lines)]
+        return df
+
+    def top(self, table, start_date, end_date, lines=None, n=10, offset=0, order='recent'):
+        """Rows offset..offset+n-1 of the filter, newest first ('recent') or by amount ('largest')"""
+        if table not in self.top_rows:
+            return self.tables[table].iloc[:0]
+        index = self.top_rows[table]
+        lookup = index.largest if order == 'largest' else index.most_recent
+        return self.tables[table].iloc[lookup(start_date, end_date, lines, n, offset)]
+
+    def member_rows(self, name):
+        """A member's rows in each table ({table: frame}, Date order), None for an unknown name"""
+        member_id = self.member_index.find(name)
+        if member_id is None:
+            return None
+        return {table: df.iloc[self.member_index.rows(table, member_id)] for table, df in self.tables.items()}
+
+    def count(self, table, start_date, end_date, lines=None):
+        """Number of rows of ``table`` in the filter"""
+        if table not in self.top_rows:
+            return len(self.filter(table, start_date, end_date, lines))
+        return self.top_rows[table].count(start_date, end_date, lines)
+
+
+def _convert_frames(tables, rates):
+    # Currency conversion to MYR: one block per frame, per-date rates from the rate table
+    # (original currency and applied rate are kept in Original_Currency / FX_Rate)
+    frames = []
+    for table, df in zip(TABLES, tables):
+        validate_columns(df, table)
+        frames.append(apply_schema(normalize_currency(df, rates), table))
+    return tuple(frames)
+
+
+def load_frames(data_dir=DATA_DIR, rates=None, cache_dir=CACHE_DIR):
+    """Ingested deposit, withdraw and member frames, in MYR and in the compact schema"""
+    # Only new export files are parsed, the rest comes from the columnar store
+    tables = load_tables(data_dir, cache_dir)
+    if rates is None:
+        rates = load_rate_table(RATES_FILE)
+    return _convert_frames(tables, rates)
+
+
+def data_key(snapshot_versions, rates):
+    """Identity of loaded data that holds across processes: snapshot versions and rate table"""
+    digest = hashlib.blake2b(repr(sorted(snapshot_versions.items())).encode(), digest_size=8)
+    digest.update(pd.util.hash_pandas_object(rates, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def scan_frame(table, start_date, end_date, lines=None, columns=None, rates=None, cache_dir=CACHE_DIR):
+    """Rows of the filter read from the columnar store, in MYR and in the compact schema.
+
+    Nothing of the loaded history is needed: only the partitions of the
+    date range and Lines and only ``columns`` (plus what the currency
+    conversion needs) are read, see ``ingest.scan_table``.
+    """
+    read = None if columns is None else list(dict.fromkeys([*columns, 'Date', 'Currency']))
+    df = scan_table(table, start_date, end_date, lines, read, cache_dir=cache_dir)
+    if rates is None:
+        rates = load_rate_table(RATES_FILE)
+    df = apply_schema(normalize_currency(df, rates), table)
+    return df if columns is None else df[[col for col in columns if col in df.columns]]
+
+
+def load_store(data_dir=DATA_DIR, version=0, rates=None, ingest=True, cache_dir=CACHE_DIR):
+    """A DataStore for the current contents of data_dir.
+
+    With ``ingest=False`` the store is read as the last ingest left it (when
+    a SourceWatcher does the ingesting); errors are raised either way.
+    """
+    if ingest:
+        ingest_directory(data_dir, cache_dir)
+    snapshot_versions, tables = load_snapshots(cache_dir)
+    if rates is None:
+        rates = load_rate_table(RATES_FILE)
+    frames = _convert_frames(tables, rates)
+    return DataStore(*frames, version=version, key=data_key(snapshot_versions, rates))
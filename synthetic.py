@@ -0,0 +1,160 @@
+"""Synthetic deposit, withdraw and member report exports for benchmarks.
+
+The generated frames have the columns and value ranges of the real exports:
+18 Lines (L01..L18), members with a home Line and a home currency (MYR or
+SGD, about a third SGD by default), daily activity that differs per member,
+gamma-distributed amounts and a per-day SGD rate table. Everything is
+vectorized per day, so tens of millions of member report rows can be
+generated in memory; an XLSX sheet holds at most about a million rows, so
+larger tables are split over several workbooks that the ingest picks up
+like partial exports::
+
+    python synthetic.py --members 50000 --days 60 --output bench_data
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from currency import BASE_CURRENCY, DEFAULT_RATES
+from export import XLSX_MAX_ROWS, iter_chunks, write_xlsx
+
+LINES = [f"L{i:02d}" for i in range(1, 19)]
+START_DATE = '2025-01-31'
+
+# File name stems that match the ingest's export patterns
+FILE_STEMS = {'deposit': 'deposit_synthetic', 'withdraw': 'withdraw_synthetic', 'member': 'member_report_synthetic'}
+
+
+def generate_exports(members=10_000, days=30, start_date=START_DATE, seed=0, sgd_share=0.3, activity=0.35):
+    """Deposit, withdraw and member frames of ``members`` members over ``days`` days.
+
+    ``activity`` is the mean share of members that play on a day. Rows are
+    in (Date, Line) order like the ingested tables.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=days)
+    names = pd.Index([f"member{i:07d}" for i in range(members)])
+    codes = pd.Index([f"U{i:08d}" for i in range(members)])
+    home_line = rng.integers(0, len(LINES), members).astype(np.int8)
+    currency = (rng.random(members) < sgd_share).astype(np.int8)
+    # Some members play almost daily, most only now and then
+    play_rate = np.clip(rng.beta(1.2, 1.2 / activity - 1.2, members), 0.01, 1.0)
+
+    day_idx, member_idx = [], []
+    for day in range(days):
+        active = np.flatnonzero(rng.random(members) < play_rate)
+        day_idx.append(np.full(len(active), day, dtype=np.int32))
+        member_idx.append(active)
+    day_idx = np.concatenate(day_idx)
+    member_idx = np.concatenate(member_idx)
+    order = np.lexsort((member_idx, home_line[member_idx], day_idx))
+    day_idx, member_idx = day_idx[order], member_idx[order]
+    n = len(member_idx)
+
+    # SGD rows carry SGD amounts (about 1/3.4 of the MYR ones)
+    scale = np.where(currency[member_idx] == 1, 1 / DEFAULT_RATES['SGD'], 1.0)
+    cases_bets = rng.integers(1, 300, n).astype(np.int32)
+    bets_amount = (cases_bets * rng.gamma(2.0, 15.0, n) * scale).round(2)
+    valid_amount = (bets_amount * rng.uniform(0.85, 1.0, n)).round(2)
+    ggr = (valid_amount * rng.normal(0.04, 0.12, n)).round(2)
+    add_bonus = (rng.gamma(0.6, 20.0, n) * scale).round(2)
+    deduct_bonus = (add_bonus * rng.uniform(0.0, 0.2, n)).round(2)
+    deposit_amount = (rng.gamma(1.5, 150.0, n) * scale * (rng.random(n) < 0.6)).round(2)
+    withdraw_amount = (rng.gamma(1.5, 130.0, n) * scale * (rng.random(n) < 0.4)).round(2)
+    row_dates = dates.values[day_idx]
+    month_codes, months = pd.factorize(dates.strftime('%Y-%m'))
+
+    common = {
+        'Date': row_dates,
+        'User_Name': pd.Categorical.from_codes(member_idx, names),
+        'Unique_Code': pd.Categorical.from_codes(member_idx, codes),
+        'Line': pd.Categorical.from_codes(home_line[member_idx], LINES),
+        'Currency': pd.Categorical.from_codes(currency[member_idx], [BASE_CURRENCY, 'SGD']),
+    }
+    member_df = pd.DataFrame({
+        'Date': row_dates,
+        'Month': pd.Categorical.from_codes(month_codes[day_idx], months),
+        **{col: values for col, values in common.items() if col != 'Date'},
+        'Deposit_Amount': deposit_amount,
+        'Withdraw_Amount': withdraw_amount,
+        'Bonus': add_bonus - deduct_bonus,
+        'Add_Bonus': add_bonus,
+        'Deduct_Bonus': deduct_bonus,
+        'Add_Transaction': 0.0,
+        'Deduct_Transaction': 0.0,
+        'Cases_Bets': cases_bets,
+        'Bets_Amount': bets_amount,
+        'Valid_Amount': valid_amount,
+        'GGR': ggr,
+        'Net_Profit': (ggr - add_bonus + deduct_bonus).round(2),
+        'Winrate': rng.beta(5, 5, n).round(4),
+    })
+
+    # One deposit / withdraw row per member and day with a non-zero amount
+    has_deposit = deposit_amount > 0
+    deposit_df = pd.DataFrame({col: values[has_deposit] for col, values in common.items()})
+    deposit_df['Deposit_Amount'] = deposit_amount[has_deposit]
+    deposit_df['Deposit_Cases'] = rng.integers(1, 6, int(has_deposit.sum())).astype(np.int32)
+
+    has_withdraw = withdraw_amount > 0
+    withdraw_df = pd.DataFrame({col: values[has_withdraw] for col, values in common.items()})
+    withdraw_df['Withdraw_Amount'] = withdraw_amount[has_withdraw]
+    withdraw_df['Withdraw_Cases'] = rng.integers(1, 4, int(has_withdraw.sum())).astype(np.int32)
+
+    return {'deposit': deposit_df, 'withdraw': withdraw_df, 'member': member_df}
+
+
+def generate_rates(days=30, start_date=START_DATE, seed=0):
+    """Daily SGD rates in the rate table format, a random walk around the default rate"""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.004, days)
+    return pd.DataFrame({
+        'Date': pd.date_range(start_date, periods=days),
+        'Currency': 'SGD',
+        'Rate': (DEFAULT_RATES['SGD'] * np.exp(np.cumsum(steps))).round(4),
+    })
+
+
+def write_exports(frames, output_dir, rates=None, max_rows=XLSX_MAX_ROWS - 1):
+    """Write the frames as export workbooks (and ``rates`` as fx_rates.csv); returns the paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for table, df in frames.items():
+        parts = max(1, -(-len(df) // max_rows))
+        for part in range(parts):
+            suffix = f"_{part + 1:03d}" if parts > 1 else ''
+            path = os.path.join(output_dir, f"{FILE_STEMS[table]}{suffix}.xlsx")
+            write_xlsx(iter_chunks(df.iloc[part * max_rows:(part + 1) * max_rows]), path)
+            paths.append(path)
+    if rates is not None:
+        path = os.path.join(output_dir, 'fx_rates.csv')
+        rates.to_csv(path, index=False, date_format='%Y-%m-%d')
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic export workbooks")
+    parser.add_argument('--members', type=int, default=10_000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sgd-share', type=float, default=0.3)
+    parser.add_argument('--activity', type=float, default=0.35)
+    parser.add_argument('--output', required=True, help="directory for the workbooks and fx_rates.csv")
+    args = parser.parse_args(argv)
+
+    frames = generate_exports(args.members, args.days, args.start, args.seed, args.sgd_share, args.activity)
+    rates = generate_rates(args.days, args.start, args.seed)
+    for path in write_exports(frames, args.output, rates):
+        print(path)
+    for table, df in frames.items():
+        print(f"{table}: {len(df):,} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Parity of the execution backends with the pandas reference.
+
+``calculate_comprehensive_analytics`` and ``generate_time_series_analytics``
+run on every backend for a few filters; every metric, table cell and series
+value must match the pandas result within a relative tolerance (sums may
+differ in the last bits because engines add in a different order).
+Backends whose optional package is not installed are skipped.
+
+Synthetic data by default; ``DASHBOARD_PARITY_DATA_DIR`` checks the
+ingested exports of a directory instead::
+
+    python -m pytest tests/test_backend_parity.py
+    DASHBOARD_PARITY_DATA_DIR=. python -m pytest tests/test_backend_parity.py
+"""
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import calculate_comprehensive_analytics, generate_time_series_analytics
+from backends import BACKENDS, get_backend
+from currency import normalize_currency
+from ingest import TABLES
+from schema import apply_schema
+from store import DataStore, load_frames
+from synthetic import generate_exports, generate_rates
+
+REFERENCE = 'pandas'
+RTOL = 1e-9
+DATA_DIR = os.environ.get('DASHBOARD_PARITY_DATA_DIR')
+
+
+def compare(expected, actual, path='', rtol=RTOL):
+    """Descriptions of the differences between two analytics results"""
+    if isinstance(expected, dict):
+        if set(expected) != set(actual):
+            return [f"{path}: keys {sorted(set(expected) ^ set(actual))} differ"]
+        return [diff for key in expected for diff in compare(expected[key], actual[key], f"{path}.{key}", rtol)]
+    if isinstance(expected, pd.DataFrame):
+        if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+            return [f"{path}: shape {expected.shape} / {list(expected.columns)} vs {actual.shape} / {list(actual.columns)}"]
+        diffs = []
+        for col in expected.columns:
+            left, right = expected[col].reset_index(drop=True), actual[col].reset_index(drop=True)
+            if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+                same = np.isclose(left.to_numpy('float64'), right.to_numpy('float64'), rtol=rtol, atol=0, equal_nan=True)
+            else:
+                same = (left.astype(str) == right.astype(str)).to_numpy()
+            for row in np.flatnonzero(~same)[:5]:
+                diffs.append(f"{path}[{row}].{col}: {left.iloc[row]!r} != {right.iloc[row]!r}")
+        return diffs
+    if not np.isclose(float(expected), float(actual), rtol=rtol, atol=0, equal_nan=True):
+        return [f"{path}: {expected!r} != {actual!r}"]
+    return []
+
+
+@pytest.fixture(scope='module')
+def store():
+    if DATA_DIR:
+        frames = load_frames(DATA_DIR)
+    else:
+        generated = generate_exports(members=2_000, days=30)
+        rates = generate_rates(30)
+        frames = tuple(apply_schema(normalize_currency(generated[table], rates), table) for table in TABLES)
+    return DataStore(*frames)
+
+
+def scenario_filter(store, scenario):
+    """The (start, end, lines) of a filter: everything, one Line, the last week"""
+    dates, lines = store.cube.dates, store.cube.lines
+    start, end = dates[0].astype(object), dates[-1].astype(object)
+    if scenario == 'line':
+        return start, end, (lines[0],)
+    if scenario == 'week':
+        return max(start, end - timedelta(days=6)), end, None
+    return start, end, None
+
+
+def run(backend, frames):
+    return {
+        'analytics': calculate_comprehensive_analytics(*frames, backend=backend),
+        'time_series': generate_time_series_analytics(*frames, backend=backend),
+    }
+
+
+@pytest.mark.parametrize('scenario', ['all', 'line', 'week'])
+@pytest.mark.parametrize('backend', [name for name in BACKENDS if name != REFERENCE])
+def test_backend_matches_pandas(store, backend, scenario):
+    try:
+        get_backend(backend)
+    except ImportError as e:
+        pytest.skip(str(e))
+    start, end, lines = scenario_filter(store, scenario)
+    frames = tuple(store.filter(table, start, end, lines) for table in TABLES)
+    assert compare(run(REFERENCE, frames), run(backend, frames)) == []
@@ -0,0 +1,83 @@
+"""Top-N row lookups (most recent, largest amount) over a date range and Lines.
+
+``TopRows`` groups the row positions of a frame per (Date, Line) cell once
+at load time, in two orders: newest first and largest amount first. A
+query only touches the cells of the filter: the most recent N rows are
+read from the newest days backwards until N rows are found, the largest N
+rows from the first N entries of each cell. Neither scans the frame, and
+the result is a handful of row positions for ``iloc``.
+"""
+import numpy as np
+import pandas as pd
+
+from distinct import _ranges
+
+
+class TopRows:
+    """Per-cell row orders of one frame for most-recent-N and largest-N queries"""
+
+    def __init__(self, df, amount_column, dates, lines):
+        self.dates = dates
+        self.lines = list(lines)
+        self.n_lines = len(self.lines)
+        n_cells = len(dates) * self.n_lines
+
+        # Views on the frame's own arrays, used to order candidates across cells
+        self.timestamps = df['Date'].to_numpy()
+        self.amounts = df[amount_column].to_numpy()
+
+        day_idx = np.searchsorted(dates, self.timestamps.astype('datetime64[D]'))
+        line_idx = pd.Categorical(df['Line'], categories=self.lines).codes
+        valid = np.flatnonzero(line_idx >= 0)
+        cell = day_idx[valid] * self.n_lines + line_idx[valid]
+        position_dtype = np.int32 if len(df) < 2**31 else np.int64
+
+        # lexsort: the last key is the primary one; ties go to the later row
+        timestamps = self.timestamps[valid].view('int64')
+        amounts = np.nan_to_num(self.amounts[valid].astype('float64'), nan=-np.inf)
+        self.by_recency = valid[np.lexsort((-valid, -timestamps, cell))].astype(position_dtype)
+        self.by_amount = valid[np.lexsort((-valid, -amounts, cell))].astype(position_dtype)
+        self.offsets = np.searchsorted(np.sort(cell), np.arange(n_cells + 1))
+
+    def _bounds(self, start_date, end_date, lines):
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, 'D'), 'left')
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, 'D'), 'right')
+        line_idx = np.arange(self.n_lines) if lines is None else np.flatnonzero(np.isin(self.lines, list(lines)))
+        return lo, max(hi, lo), line_idx
+
+    def count(self, start_date, end_date, lines=None):
+        """Number of rows in the date range on ``lines`` (None = all lines)"""
+        lo, hi, line_idx = self._bounds(start_date, end_date, lines)
+        cells = (np.arange(lo, hi)[:, None] * self.n_lines + line_idx[None, :]).ravel()
+        return int((self.offsets[cells + 1] - self.offsets[cells]).sum())
+
+    def most_recent(self, start_date, end_date, lines=None, n=10, offset=0):
+        """Positions of rows offset..offset+n-1, newest first"""
+        lo, hi, line_idx = self._bounds(start_date, end_date, lines)
+        need = offset + n
+        found, total = [], 0
+        # Newest day first, until enough rows are collected
+        for day in range(hi - 1, lo - 1, -1):
+            cells = day * self.n_lines + line_idx
+            rows = self.by_recency[_ranges(self.offsets[cells], self.offsets[cells + 1])]
+            found.append(rows)
+            total += len(rows)
+            if total >= need:
+                break
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(found)
+        order = np.lexsort((-rows.astype(np.int64), -self.timestamps[rows].view('int64')))
+        return rows[order][offset:need]
+
+    def largest(self, start_date, end_date, lines=None, n=10, offset=0):
+        """Positions of rows offset..offset+n-1 by amount, largest first"""
+        lo, hi, line_idx = self._bounds(start_date, end_date, lines)
+        need = offset + n
+        cells = (np.arange(lo, hi)[:, None] * self.n_lines + line_idx[None, :]).ravel()
+        # Only the first ``need`` rows of each cell can make it into the result
+        starts = self.offsets[cells]
+        rows = self.by_amount[_ranges(starts, np.minimum(self.offsets[cells + 1], starts + need))]
+        amounts = np.nan_to_num(self.amounts[rows].astype('float64'), nan=-np.inf)
+        order = np.lexsort((-rows.astype(np.int64), -amounts))
+        return rows[order][offset:need]
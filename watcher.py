@@ -0,0 +1,107 @@
+"""Background change detection for the dashboard's source files.
+
+A ``SourceWatcher`` thread polls the export files in the data directory and
+the exchange rate file. Polling only stats a handful of files, so an idle
+dashboard costs next to nothing. When a stat changes, new exports are
+ingested in the background and ``version`` is bumped, but only if the data
+really changed: content hashes decide, so a touched file does not count.
+Sessions compare ``version`` with the one they rendered to decide whether
+a rerun is needed.
+
+A failed ingest (a bad or half-copied export) is kept in ``last_error``
+until the sources change again; the failing files are not parsed again
+before that, and the next successful ingest always bumps ``version``, so
+nothing loaded while the sources were broken is kept.
+"""
+import fnmatch
+import os
+import threading
+from datetime import datetime
+
+from currency import RATES_FILE
+from ingest import CACHE_DIR, DATA_DIR, EXPORT_PATTERNS, hash_file, ingest_directory
+
+POLL_INTERVAL = 5.0
+
+# Data key while the last ingest failed: differs from every real key
+_FAILED = object()
+
+
+class SourceWatcher:
+    """Polls the source files and keeps a data version for the loaded data"""
+
+    def __init__(self, data_dir=DATA_DIR, rates_file=RATES_FILE, cache_dir=CACHE_DIR, interval=POLL_INTERVAL,
+                 progress=None, initial_check=True):
+        self.data_dir = data_dir
+        self.rates_file = rates_file
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.version = 0
+        self.last_change = None
+        self.last_error = None
+        self._stats = None
+        self._data_key = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='source-watcher', daemon=True)
+        # The first check ingests synchronously so the first page load sees the data;
+        # ``progress`` reports that (possibly long) cold ingest. With ``initial_check=False``
+        # the owner makes that first poll() itself
+        if initial_check:
+            self.poll(progress)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _source_stats(self):
+        patterns = [pattern for table_patterns in EXPORT_PATTERNS.values() for pattern in table_patterns]
+        stats = []
+        for name in sorted(os.listdir(self.data_dir)):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                stat = os.stat(os.path.join(self.data_dir, name))
+                stats.append((name, stat.st_mtime_ns, stat.st_size))
+        if os.path.exists(self.rates_file):
+            stat = os.stat(self.rates_file)
+            stats.append((self.rates_file, stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def check(self, progress=None):
+        """Look for changed sources now and return the current data version"""
+        with self._lock:
+            stats = self._source_stats()
+            if stats == self._stats:
+                return self.version
+            # Recorded up front: sources that fail to ingest are not parsed again until they change
+            self._stats = stats
+            try:
+                manifest = ingest_directory(self.data_dir, self.cache_dir, progress)
+                rates_hash = hash_file(self.rates_file) if os.path.exists(self.rates_file) else None
+            except Exception as e:
+                self.last_error = str(e)
+                self._data_key = _FAILED
+                raise
+            self.last_error = None
+            data_key = (manifest['version'], rates_hash)
+            if data_key != self._data_key:
+                if self._data_key is not None:
+                    self.version += 1
+                    self.last_change = datetime.now()
+                self._data_key = data_key
+            return self.version
+
+    def poll(self, progress=None):
+        """check(), with a failure only kept in ``last_error`` instead of raised"""
+        try:
+            self.check(progress)
+        except Exception:
+            # Keep watching; a half-copied export is picked up once it changes again
+            pass
+        return self.version
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()